@@ -7,8 +7,9 @@ __version__ = '0.1'
 
 from .utils import get_signal_processor_class
 from .backends import AlgoliaIndexer
+from .query import AlgoliaQuery
 
-__all__ = ['AlgoliaIndexer']
+__all__ = ['AlgoliaIndexer', 'AlgoliaQuery']
 
 signal_processor_class = get_signal_processor_class()
 signal_processor = signal_processor_class()
@@ -1,14 +1,27 @@
 # -*- coding: utf-8 -*-
+import time
 import warnings
 
 from django.conf import settings
 from django.db.models import get_models
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ImproperlyConfigured
 
 from algoliasearch import algoliasearch
 
-from .utils import get_instance_fields, is_algolia_managed
-from .models import AlgoliaIndex
+from .utils import (
+    get_instance_fields, is_algolia_managed, get_split_field, split_text,
+    get_chunk_object_id, get_record_fingerprint, deduplicate_hits, iterate_chunks, DISTINCT_KEY,
+    get_indexable_queryset, filter_indexable, get_dependencies, get_related_model,
+    get_facets, get_tags_field, TAGS_KEY, FACET_STRING, FACET_NUMERIC,
+    get_shard_field, get_shard, get_shards, get_shard_related, get_shard_value, is_routable,
+    SHARD_SEPARATOR,
+)
+from .query import AlgoliaQuery
+from .models import (
+    AlgoliaIndex, AlgoliaRebuild, AlgoliaRebuildCheckpoint,
+    get_instance_identifier, get_instance_key, get_model_identifier,
+)
 
 __all__ = ['AlgoliaIndexer']
 
@@ -30,11 +43,14 @@ class AlgoliaIndexer(object):
             'SUFFIX_MY_INDEX': True,
             'INDEX_SUFFIX': 'DjangoAlgolia',
             'TEST_MODE': False,
+            'SPLIT_SIZE': 1000,
         }
     """
 
     client = None
     is_valid = False
+    dependencies = None
+    configured_indexes = None
 
     # Returned content for test mode
     test_response = {
@@ -82,8 +98,16 @@ class AlgoliaIndexer(object):
             )
         return self.client
 
-    def _get_index_name(self, instance=None, model=None, with_suffix=True):
-        """Return the name of index for a specific instance or model"""
+    def _get_index_name(self, instance=None, model=None, with_suffix=True, shard=None):
+        """
+        Return the name of index for a specific instance or model.
+
+        The instances of a model with an ALGOLIA_SHARD_FIELD are routed to one
+        index by shard, named like MyPonyDjangoAlgolia__<shard>: the shard is read
+        from the instance, or has to be specified with a model. The separator
+        can not be used in the index name of a sharded model, so the shard of
+        an index is read without ambiguity.
+        """
         if instance and not model:
             model = instance.__class__
         elif model and not instance:
@@ -98,22 +122,46 @@ class AlgoliaIndexer(object):
         if with_suffix and self.configs.get('SUFFIX_MY_INDEX', True):
             index_name = index_name + self.configs.get('INDEX_SUFFIX', 'DjangoAlgolia')
 
+        shard_field = get_shard_field(model)
+        if shard_field:
+            if SHARD_SEPARATOR in index_name:
+                raise ValueError('The index name {0} of a sharded model can not contain "{1}", '
+                                 'which separates the shards'.format(index_name, SHARD_SEPARATOR))
+            if instance is not None:
+                shard = get_shard(instance)
+            if shard is None:
+                raise ValueError('{0} is sharded by {1}, you must specify a shard'.format(
+                    model.__name__,
+                    shard_field,
+                ))
+            index_name = u'{0}{1}{2}'.format(index_name, SHARD_SEPARATOR, shard)
+        elif shard is not None:
+            raise ValueError('{0} is not sharded'.format(model.__name__))
+
         return index_name
 
-    def get_index(self, instance=None, model=None, index_name=None, with_suffix=True):
+    def get_index(self, instance=None, model=None, index_name=None, with_suffix=True, shard=None):
         """Useful to dissociate the production indexes and the test indexes
 
         Use:
             instance = Model()
             get_index(instance)
             get_index(model=Model)
+            get_index(model=ShardedModel, shard='acme')
             get_index(index_name='MyAlgoliaIndex')
         """
         if not index_name:
-            index_name = self._get_index_name(instance, model, with_suffix=with_suffix)
+            index_name = self._get_index_name(instance, model, with_suffix=with_suffix, shard=shard)
 
         return self.get_client().init_index(index_name)
 
+    def get_indexes(self, model):
+        """Returns the index of a model, or the indexes of all its shards stored in database"""
+        if not get_shard_field(model):
+            return [self.get_index(model=model)]
+
+        return [self.get_index(model=model, shard=shard) for shard in get_shards(model)]
+
     def search(self, model, query, *args, **kwargs):
         """
         Makes a query to Algolia API and return the response as a dict
@@ -126,13 +174,45 @@ class AlgoliaIndexer(object):
             response = indexer.search(School, 'Hardvard')
 
         Note that you can specify all parameters which you can specify
-        to algolia's "search" function.
+        to algolia's "search" function. The searches of a sharded model
+        are sent to the index of one shard:
+
+            response = indexer.search(Pony, 'Rainbow', shard='acme')
+
+        If the model is split into several records, Algolia counts and returns
+        only the best ranked record of each instance (`distinct`). The hits are
+        de-duplicated again, in case the index settings were not sent yet.
         """
         if self.configs.get('TEST_MODE', False):
             return self.test_response
 
-        index = self.get_index(model=model)
-        return index.search(query, *args, **kwargs)
+        shard = kwargs.pop('shard', None)
+        index = self.get_index(model=model, shard=shard)
+        split_field = get_split_field(model)
+
+        if split_field:
+            args = list(args)
+            params = dict((args.pop(0) if args else kwargs.pop('args', None)) or {})
+            params.setdefault('distinct', 1)
+            args.insert(0, params)
+
+        response = index.search(query, *args, **kwargs)
+
+        if split_field:
+            response['hits'] = deduplicate_hits(response.get('hits', []))
+
+        return response
+
+    def query(self, model):
+        """
+        Returns a query builder on the index of a model
+
+        Use:
+            indexer = AlgoliaIndexer()
+            query = indexer.query(School).search('Harvard').filter(students__gte=1000)
+            response = query.execute()
+        """
+        return AlgoliaQuery(model, indexer=self)
 
     def get_algolia_index(self, instance):
         """Returns the index of a specific instance"""
@@ -146,61 +226,777 @@ class AlgoliaIndexer(object):
             algolia_index = AlgoliaIndex.create_object(index.index_name, instance)
         return index, algolia_index
 
-    def save(self, instance, created=False):
-        """Stores or updates index of a model on Algolia API"""
-        fields = get_instance_fields(instance)
-        kwargs = {}
-
-        for field in fields:
-            value = getattr(instance, field, None)
-
-            try:
-                value = unicode(value)
-            except ValueError:
-                message = ('{0}.{1} "{2}" can not be cast into a string '
-                           'to be stored to Algolia Index')
-
-                warnings.warn(message.format(
-                    instance.__class__.__name__,
-                    field,
-                    value,
-                ))
+    def get_field_value(self, instance, field):
+        """Returns the value of an instance field, cast into a string"""
+        value = getattr(instance, field, None)
+
+        try:
+            value = unicode(value)
+        except ValueError:
+            message = ('{0}.{1} "{2}" can not be cast into a string '
+                       'to be stored to Algolia Index')
+
+            warnings.warn(message.format(
+                instance.__class__.__name__,
+                field,
+                value,
+            ))
+
+        return value
+
+    def get_numeric_value(self, instance, field):
+        """Returns the value of a numeric facet, kept as a number for numericFilters"""
+        value = getattr(instance, field, None)
+
+        if value is None or isinstance(value, (int, long)):
+            return value
+        return float(value)
+
+    def get_tags(self, instance, field):
+        """Returns the tags of an instance, from an iterable of strings or a related manager"""
+        tags = getattr(instance, field, None)
+
+        if tags is None:
+            return []
+        if callable(tags):
+            tags = tags()
+        if hasattr(tags, 'all'):
+            tags = tags.all()
+        return sorted(set(unicode(tag) for tag in tags))
+
+    def get_record(self, instance, attributes=None):
+        """
+        Returns the fields of an instance to store on Algolia API, or only
+        the ones listed in `attributes` for a partial update
+        """
+        record = {}
+        facets = get_facets(instance.__class__)
+
+        for field in get_instance_fields(instance):
+            if attributes is not None and field not in attributes:
+                continue
+            if facets.get(field) == FACET_NUMERIC:
+                record[field] = self.get_numeric_value(instance, field)
+            else:
+                record[field] = self.get_field_value(instance, field)
+
+        tags_field = get_tags_field(instance)
+        if tags_field and (attributes is None or tags_field in attributes):
+            record[TAGS_KEY] = self.get_tags(instance, tags_field)
+
+        if attributes is None:
+            record['__unicode__'] = unicode(instance)
+        return record
+
+    def get_index_settings(self, model):
+        """Returns the settings of the index required by the options of a model"""
+        index_settings = {}
+
+        if get_split_field(model):
+            index_settings['attributeForDistinct'] = DISTINCT_KEY
+
+        string_facets = sorted(
+            name for name, facet_type in get_facets(model).items() if facet_type == FACET_STRING
+        )
+        if string_facets:
+            index_settings['attributesForFaceting'] = string_facets
+
+        return index_settings
+
+    def configure_index(self, index, model, force=False):
+        """
+        Sends the settings required by a model to its index, once by process unless `force`
+        is set: the first save of a split model sets the distinct attribute of the searches
+        """
+        if self.configured_indexes is None:
+            self.configured_indexes = set()
+
+        key = (index.index_name, model)
+        if key in self.configured_indexes and not force:
+            return
+
+        index_settings = self.get_index_settings(model)
+        if index_settings:
+            index.set_settings(index_settings)
+        self.configured_indexes.add(key)
+
+    def get_split_size(self, instance):
+        """Returns the maximum length of a chunk of the split field"""
+        return getattr(instance, 'ALGOLIA_SPLIT_SIZE', self.configs.get('SPLIT_SIZE', 1000))
+
+    def get_records(self, instance, algolia_index, record=None):
+        """
+        Returns the records which represent an instance on Algolia API.
+
+        A split instance is represented by one record for each chunk of its
+        split field, all sharing the same distinct key.
+        """
+        if record is None:
+            record = self.get_record(instance)
+
+        split_field = get_split_field(instance)
+        if not split_field:
+            record['objectID'] = algolia_index.id
+            return [record]
+
+        text = record.get(split_field) or u''
+        records = []
 
-            kwargs[field] = value
+        for position, chunk in enumerate(split_text(text, self.get_split_size(instance))):
+            chunk_record = dict(record)
+            chunk_record[split_field] = chunk
+            chunk_record[DISTINCT_KEY] = algolia_index.id
+            chunk_record['objectID'] = get_chunk_object_id(algolia_index.id, position)
+            records.append(chunk_record)
 
+        return records
+
+    def save(self, instance, created=False):
+        """Stores or updates index of a model on Algolia API"""
+        record = self.get_record(instance)
         index, algolia_index = self.get_or_create_algolia_index(instance)
-        object_id = algolia_index.id
+        records = self.get_records(instance, algolia_index, record)
+        self.configure_index(index, instance.__class__)
 
-        kwargs['objectID'] = object_id
-        kwargs['__unicode__'] = unicode(instance)
+        if get_split_field(instance):
+            return self.save_chunks(index, algolia_index, records)
 
         if created:
-            return index.save_object(kwargs)
+            return index.save_object(records[0])
         else:
-            return index.partial_update_object(kwargs)
+            return index.partial_update_object(records[0])
+
+    def save_chunks(self, index, algolia_index, records):
+        """
+        Stores the records of a split instance.
+
+        Only the records which changed since the last save are sent to Algolia API.
+        """
+        return self.bulk_save_chunks(index, [(algolia_index, records)])
+
+    def bulk_save_chunks(self, index, items):
+        """
+        Stores the records of several split instances, from a list of
+        (AlgoliaIndex object, records) tuples, with one batched call.
+        """
+        changed_records = []
+        removed_object_ids = []
+        changed_fingerprints = []
+
+        for algolia_index, records in items:
+            fingerprints = [get_record_fingerprint(record) for record in records]
+            previous_fingerprints = algolia_index.get_chunks()
+
+            changed_records.extend(
+                record for position, record in enumerate(records)
+                if previous_fingerprints[position:position + 1] != [fingerprints[position]]
+            )
+            removed_object_ids.extend(
+                get_chunk_object_id(algolia_index.id, position)
+                for position in range(len(records), len(previous_fingerprints))
+            )
+            if fingerprints != previous_fingerprints:
+                changed_fingerprints.append((algolia_index, fingerprints))
+
+        if removed_object_ids:
+            index.delete_objects(removed_object_ids)
+
+        response = None
+        if changed_records:
+            response = index.save_objects(changed_records)
+
+        for algolia_index, fingerprints in changed_fingerprints:
+            algolia_index.set_chunks(fingerprints)
+
+        return response
 
     def delete(self, instance):
         """Removes index of a model on Algolia API"""
         index, algolia_index = self.get_algolia_index(instance)
         if algolia_index:
+            # The primary key is reset by the deletion
+            object_id = algolia_index.id
+            chunks_number = len(algolia_index.get_chunks()) or 1
             algolia_index.delete()
-            return index.delete_object(algolia_index.id)
+
+            if get_split_field(instance):
+                object_ids = [
+                    get_chunk_object_id(object_id, position)
+                    for position in range(chunks_number)
+                ]
+                return index.delete_objects(object_ids)
+
+            return index.delete_object(object_id)
         return None
 
+    def get_dependent_models(self, model):
+        """
+        Returns the (dependent model, lookup, attributes) tuples of the managed
+        models which declare a dependency to `model` in their ALGOLIA_DEPENDENCIES
+        """
+        if self.dependencies is None:
+            self.dependencies = {}
+
+            for dependent_model in get_models():
+                if not is_algolia_managed(dependent_model):
+                    continue
+
+                for lookup, attributes in get_dependencies(dependent_model).items():
+                    related_model = get_related_model(dependent_model, lookup)
+                    self.dependencies.setdefault(related_model, []).append(
+                        (dependent_model, lookup, attributes)
+                    )
+
+        return self.dependencies.get(model, [])
+
+    def update_dependents(self, instance, chunk_size=1000):
+        """
+        Updates the attributes of the indexed instances which depend on `instance`.
+
+        The dependent instances are fetched with their related objects by chunks,
+        and only the affected attributes are sent with one batched partial update by chunk.
+
+        Use:
+            class Article(models.Model):
+                ALGOLIA_INDEX_FIELDS = ('title', 'author_name',)
+                ALGOLIA_DEPENDENCIES = {'author': ('author_name',)}
+
+                @property
+                def author_name(self):
+                    return self.author.name
+        """
+        responses = []
+
+        for model, lookup, attributes in self.get_dependent_models(instance.__class__):
+            split_field = get_split_field(model)
+            queryset = model.objects.filter(**{lookup: instance}).select_related(lookup)
+
+            # The shards of the dependents are read with them
+            shard_related = get_shard_related(model)
+            if shard_related:
+                queryset = queryset.select_related(shard_related)
+
+            for chunk in iterate_chunks(queryset, chunk_size):
+                # The dependents of a sharded model can be stored into several indexes
+                for index, dependents in self.group_by_index(filter(is_routable, chunk)):
+                    response = self._update_attributes(index, dependents, attributes, split_field)
+                    if response is not None:
+                        responses.append(response)
+
+        return responses
+
+    def _update_attributes(self, index, instances, attributes, split_field):
+        """Sends some attributes of the instances of an index with one batched partial update"""
+        algolia_indexes = AlgoliaIndex.objects.for_instances(index.index_name, instances)
+        instances = dict((get_instance_key(instance), instance) for instance in instances)
+
+        # The dependent attributes are copied into every chunk of a split instance, whose
+        # records are all stored again with their fingerprints
+        if split_field:
+            return self.bulk_save_chunks(index, [
+                (algolia_index, self.get_records(instances[algolia_index.get_key()], algolia_index))
+                for algolia_index in algolia_indexes
+            ])
+
+        records = []
+        for algolia_index in algolia_indexes:
+            # The values have the same types as with a whole save
+            record = self.get_record(instances[algolia_index.get_key()], attributes)
+            record['objectID'] = algolia_index.id
+            records.append(record)
+
+        if not records:
+            return None
+
+        return index.partial_update_objects(records)
+
     def clear_index(self, index_name):
         """Deletes all instances from specified index"""
         return self.get_index(index_name=index_name).clear_index()
 
-    def rebuild_index(self, index):
-        """Clears index and reconstructs it from all associated models"""
+    def group_by_index(self, instances):
+        """Returns a list of (index, instances) tuples, an item of `instances` can be a tuple
+        whose first element is the instance"""
+        groups = {}
+        indexes = {}
+
+        for item in instances:
+            instance = item[0] if isinstance(item, tuple) else item
+            index = self.get_index(instance=instance)
+            indexes.setdefault(index.index_name, index)
+            groups.setdefault(index.index_name, []).append(item)
+
+        return [(indexes[index_name], items) for index_name, items in groups.items()]
+
+    def get_or_create_algolia_indexes(self, index, instances):
+        """
+        Returns a dict of the AlgoliaIndex objects of several instances by instance key
+        (see `get_instance_key`), and creates the missing ones with one query
+        """
+        algolia_indexes = dict(
+            (algolia_index.get_key(), algolia_index)
+            for algolia_index in AlgoliaIndex.objects.for_instances(index.index_name, instances)
+        )
+        missing_instances = [
+            instance for instance in instances
+            if get_instance_key(instance) not in algolia_indexes
+        ]
+
+        if missing_instances:
+            AlgoliaIndex.objects.bulk_create([
+                AlgoliaIndex.build_object(index.index_name, instance)
+                for instance in missing_instances
+            ])
+            # The primary keys are not returned by bulk_create
+            algolia_indexes.update(
+                (algolia_index.get_key(), algolia_index)
+                for algolia_index in AlgoliaIndex.objects.for_instances(
+                    index.index_name,
+                    missing_instances,
+                )
+            )
+
+        return algolia_indexes
+
+    def bulk_save(self, instances):
+        """
+        Stores or updates several instances on Algolia API,
+        with one query and one batched call by index
+
+        Use:
+            indexer.bulk_save([(pony, True), (other_pony, False)])
+        """
+        for index, items in self.group_by_index(instances):
+            algolia_indexes = self.get_or_create_algolia_indexes(
+                index,
+                [instance for instance, created in items],
+            )
+            created_records = []
+            updated_records = []
+            split_items = []
+
+            for model in set(instance.__class__ for instance, created in items):
+                self.configure_index(index, model)
+
+            for instance, created in items:
+                algolia_index = algolia_indexes[get_instance_key(instance)]
+                records = self.get_records(instance, algolia_index)
+
+                if get_split_field(instance):
+                    split_items.append((algolia_index, records))
+                elif created:
+                    created_records.extend(records)
+                else:
+                    updated_records.extend(records)
+
+            if created_records:
+                index.save_objects(created_records)
+            if updated_records:
+                index.partial_update_objects(updated_records)
+            if split_items:
+                self.bulk_save_chunks(index, split_items)
+
+            # An updated instance may have moved from the index of another shard
+            moved_instances = [
+                instance for instance, created in items
+                if not created and get_shard_field(instance)
+            ]
+            if moved_instances:
+                self.delete_from_indexes(moved_instances, exclude_index=index)
+
+    def bulk_delete(self, instances):
+        """
+        Removes several instances from Algolia API,
+        with one query and one batched call by index
+        """
+        # The shard of a sharded instance may have changed since it was stored,
+        # so it is removed from the indexes where the mapping table has found it
+        sharded_instances = [instance for instance in instances if get_shard_field(instance)]
+        if sharded_instances:
+            self.delete_from_indexes(sharded_instances)
+
+        instances = [instance for instance in instances if not get_shard_field(instance)]
+
+        for index, instances in self.group_by_index(instances):
+            algolia_indexes = list(AlgoliaIndex.objects.for_instances(index.index_name, instances))
+
+            if algolia_indexes:
+                self.delete_algolia_indexes(index, algolia_indexes)
+
+    def delete_from_indexes(self, instances, exclude_index=None):
+        """Removes instances from all the indexes where they are stored, except `exclude_index`"""
+        algolia_indexes = AlgoliaIndex.objects.for_instances(None, instances)
+        algolia_indexes = algolia_indexes.select_related('index')
+        if exclude_index is not None:
+            algolia_indexes = algolia_indexes.exclude(index__name=exclude_index.index_name)
+
+        algolia_indexes_by_name = {}
+        for algolia_index in algolia_indexes:
+            algolia_indexes_by_name.setdefault(algolia_index.index.name, []).append(algolia_index)
+
+        for index_name, algolia_indexes in algolia_indexes_by_name.items():
+            self.delete_algolia_indexes(self.get_index(index_name=index_name), algolia_indexes)
+
+    def delete_algolia_indexes(self, index, algolia_indexes):
+        """Removes the records of AlgoliaIndex objects from an index, and deletes the objects"""
+        object_ids = []
+        for algolia_index in algolia_indexes:
+            if get_split_field(algolia_index.get_model()):
+                object_ids.extend(
+                    get_chunk_object_id(algolia_index.id, position)
+                    for position in range(len(algolia_index.get_chunks()) or 1)
+                )
+            else:
+                object_ids.append(algolia_index.id)
+
+        AlgoliaIndex.objects.filter(
+            id__in=[algolia_index.id for algolia_index in algolia_indexes],
+        ).delete()
+        return index.delete_objects(object_ids)
+
+    def get_index_models(self, index):
+        """Returns all the models managed by the library which are stored into the index"""
+        models = []
+
+        for model in get_models():
+            if not is_algolia_managed(model):
+                continue
+
+            if get_shard_field(model):
+                if self.get_index_shard(index.index_name, model) is not None:
+                    models.append(model)
+            elif self._get_index_name(model=model) == index.index_name:
+                models.append(model)
+
+        return models
+
+    def get_index_shard(self, index_name, model):
+        """Returns the shard of a sharded model stored into an index, or None"""
+        name, separator, shard = index_name.partition(SHARD_SEPARATOR)
+
+        if shard and name + separator == self._get_index_name(model=model, shard=''):
+            return shard
+        return None
+
+    def get_index_queryset(self, index_name, model):
+        """
+        Returns the queryset of the instances of a model to store into an index:
+        the instances of its shard, for a sharded model
+        """
+        queryset = get_indexable_queryset(model)
+
+        shard_field = get_shard_field(model)
+        if shard_field:
+            # The shards are strings in the index names, like "False" for a boolean field
+            shard = get_shard_value(model, self.get_index_shard(index_name, model))
+            queryset = queryset.filter(**{shard_field: shard})
+
+            # The shards of the instances are read with them, to route them without more queries
+            shard_related = get_shard_related(model)
+            if shard_related:
+                queryset = queryset.select_related(shard_related)
+
+        return queryset
+
+    def rebuild_index(self, index, chunk_size=1000, resume=False):
+        """
+        Clears index and reconstructs it from all associated models.
+
+        If `resume` is set, the last unfinished rebuild of the index
+        is continued from its checkpoints instead.
+        """
+        rebuild = None
+        if resume:
+            rebuild = self.resume_rebuild(index)
+        if rebuild is None:
+            rebuild = self.start_rebuild(index)
+
+        self.run_rebuild(rebuild, chunk_size)
+        return rebuild
+
+    def start_rebuild(self, index, workers=1):
+        """
+        Clears index and creates an AlgoliaRebuild, whose rows are split into
+        `workers` ranges of primary keys by model, to be processed by `run_rebuild`
+        """
         index.clear_index()
         index_name = index.index_name
 
-        queryset = AlgoliaIndex.objects.filter(index=index_name)
+        queryset = AlgoliaIndex.objects.for_index(index_name)
         queryset.delete()
 
-        for model in get_models():
-            is_same_index = self.get_index(model=model).index_name == index.index_name
-            if is_algolia_managed(model) and is_same_index:
-                for instance in model.objects.all():
-                    self.save(instance)
+        rebuild = AlgoliaRebuild.objects.create(index=index_name)
+
+        for model in self.get_index_models(index):
+            self.configure_index(index, model, force=True)
+
+            queryset = self.get_index_queryset(index_name, model).order_by('pk')
+            rows_total = queryset.count()
+
+            # Bounds of the ranges, as offsets in the rows sorted by primary key
+            offsets = sorted(set(rows_total * part // workers for part in range(1, workers)))
+            offsets = [offset for offset in offsets if offset > 0]
+            pks = [
+                unicode(queryset.values_list('pk', flat=True)[offset - 1])
+                for offset in offsets
+            ]
+
+            starts = [(None, 0)] + list(zip(pks, offsets))
+            ends = list(zip(pks, offsets)) + [(None, rows_total)]
+
+            for (start_pk, start_offset), (end_pk, end_offset) in zip(starts, ends):
+                AlgoliaRebuildCheckpoint.objects.create(
+                    rebuild=rebuild,
+                    model=get_model_identifier(model),
+                    start_pk=start_pk,
+                    end_pk=end_pk,
+                    rows_total=end_offset - start_offset,
+                )
+
+            rebuild.rows_total += rows_total
+
+        rebuild.save()
+        return rebuild
+
+    def resume_rebuild(self, index):
+        """Returns the last unfinished rebuild of the index, ready to run again, or None"""
+        rebuilds = AlgoliaRebuild.objects.filter(
+            index=index.index_name,
+            status=AlgoliaRebuild.STATUS_RUNNING,
+        )
+
+        try:
+            rebuild = rebuilds.latest('id')
+        except AlgoliaRebuild.DoesNotExist:
+            return None
+
+        rebuild.resume()
+        return rebuild
+
+    def run_rebuild(self, rebuild, chunk_size=1000, progress=None, progress_interval=2):
+        """
+        Processes the pending checkpoints of a rebuild until there are none left.
+        Several workers can run the same rebuild at once.
+
+        If set, `progress` is called with the rebuild after a committed chunk,
+        at most once every `progress_interval` seconds.
+        """
+        last_progress = time.time()
+
+        while True:
+            checkpoint = rebuild.claim_checkpoint()
+            if checkpoint is None:
+                break
+
+            model = checkpoint.get_model()
+            queryset = checkpoint.filter_queryset(self.get_index_queryset(rebuild.index, model))
+
+            for instances in iterate_chunks(queryset, chunk_size):
+                indexable_instances = list(filter_indexable(model, instances))
+                self.bulk_save([(instance, True) for instance in indexable_instances])
+                checkpoint.commit(instances[-1].pk, len(instances), len(indexable_instances))
+
+                if progress is not None and time.time() - last_progress >= progress_interval:
+                    progress(rebuild)
+                    last_progress = time.time()
+
+            checkpoint.finish()
+
+        rebuild.finish()
+
+    def get_changed_records(self, records, remote_records):
+        """
+        Returns the records which are missing or different on Algolia API.
+        `remote_records` is a dict of the records returned by the API by objectID.
+        """
+        changed_records = []
+
+        for record in records:
+            remote_record = remote_records.get(unicode(record['objectID']))
+            if remote_record is None:
+                changed_records.append(record)
+                continue
+
+            expected = dict((key, value) for key, value in record.items() if key != 'objectID')
+            actual = dict((key, remote_record.get(key)) for key in expected)
+
+            if get_record_fingerprint(expected) != get_record_fingerprint(actual):
+                changed_records.append(record)
+
+        return changed_records
+
+    def audit_index(self, index, chunk_size=1000, repair=False):
+        """
+        Compares the database with the remote index and yields a
+        (status, identifier) tuple for each difference, where status is
+        'missing', 'stale' or 'orphaned'.
+
+        Both sides are read chunk by chunk, so the memory stays bounded by
+        the chunk size. If `repair` is set, each chunk is fixed with batched calls.
+
+        Use:
+            indexer = AlgoliaIndexer()
+            index = indexer.get_index(model=MyPony)
+            for status, identifier in indexer.audit_index(index, repair=True):
+                print status, identifier
+        """
+        for model in self.get_index_models(index):
+            queryset = self.get_index_queryset(index.index_name, model)
+            for instances in iterate_chunks(queryset, chunk_size):
+                instances = list(filter_indexable(model, instances))
+                for difference in self._audit_instances(index, instances, chunk_size, repair):
+                    yield difference
+
+        for difference in self._audit_remote_records(index, chunk_size, repair):
+            yield difference
+
+    def _get_remote_records(self, index, object_ids, chunk_size):
+        """Returns a dict of the records stored on Algolia API by objectID"""
+        remote_records = {}
+
+        for start in range(0, len(object_ids), chunk_size):
+            response = index.get_objects(object_ids[start:start + chunk_size])
+            for remote_record in response.get('results', []):
+                if remote_record:
+                    remote_records[unicode(remote_record['objectID'])] = remote_record
+
+        return remote_records
+
+    def _audit_instances(self, index, instances, chunk_size, repair):
+        """Finds the instances of a chunk which are missing or stale on Algolia API"""
+        keys = [get_instance_key(instance) for instance in instances]
+        algolia_indexes = dict(
+            (algolia_index.get_key(), algolia_index)
+            for algolia_index in AlgoliaIndex.objects.for_instances(index.index_name, instances)
+        )
+
+        records = {}
+        for key, instance in zip(keys, instances):
+            if key in algolia_indexes:
+                records[key] = self.get_records(instance, algolia_indexes[key])
+
+        object_ids = [
+            unicode(record['objectID'])
+            for instance_records in records.values()
+            for record in instance_records
+        ]
+        remote_records = self._get_remote_records(index, object_ids, chunk_size)
+        records_to_save = []
+
+        for key, instance in zip(keys, instances):
+            algolia_index = algolia_indexes.get(key)
+
+            if algolia_index is None:
+                status = 'missing'
+                if repair:
+                    algolia_index = AlgoliaIndex.create_object(index.index_name, instance)
+                    records[key] = self.get_records(instance, algolia_index)
+                    changed_records = records[key]
+            else:
+                changed_records = self.get_changed_records(records[key], remote_records)
+                if not changed_records:
+                    continue
+
+                is_missing = any(
+                    unicode(record['objectID']) not in remote_records
+                    for record in changed_records
+                )
+                status = 'missing' if is_missing else 'stale'
+
+            if repair:
+                records_to_save.extend(changed_records)
+                if get_split_field(instance):
+                    algolia_index.set_chunks([
+                        get_record_fingerprint(record) for record in records[key]
+                    ])
+
+            yield status, get_instance_identifier(instance)
+
+        if records_to_save:
+            index.save_objects(records_to_save)
+
+    def _audit_remote_records(self, index, chunk_size, repair):
+        """Finds the records of the remote index which do not match any instance"""
+        first_page = index.browse(0, chunk_size)
+
+        # Pages are read backward, so deleting the orphans of a page
+        # does not shift the records of the pages which are not read yet
+        for page in reversed(range(first_page.get('nbPages', 0))):
+            response = index.browse(page, chunk_size) if page else first_page
+
+            object_ids = [unicode(hit['objectID']) for hit in response.get('hits', [])]
+            orphan_object_ids, orphan_algolia_index_ids = self._get_orphans(index, object_ids)
+
+            for object_id in orphan_object_ids:
+                yield 'orphaned', object_id
+
+            if repair and orphan_object_ids:
+                index.delete_objects(orphan_object_ids)
+                AlgoliaIndex.objects.filter(id__in=orphan_algolia_index_ids).delete()
+
+    def _get_orphans(self, index, object_ids):
+        """
+        Returns the objectIDs which do not match any instance and
+        the ids of the AlgoliaIndex objects which refer to deleted instances
+        """
+        algolia_index_ids = [
+            int(object_id.split('-')[0]) for object_id in object_ids
+            if object_id.split('-')[0].isdigit()
+        ]
+        algolia_indexes = AlgoliaIndex.objects.for_index(index.index_name).filter(
+            id__in=algolia_index_ids,
+        ).in_bulk(algolia_index_ids)
+
+        # Checks the existence of the instances with one query by model
+        pks_by_content_type = {}
+        for algolia_index in algolia_indexes.values():
+            pks_by_content_type.setdefault(algolia_index.content_type_id, []).append(
+                algolia_index.object_pk,
+            )
+
+        models = {}
+        existing_keys = set()
+        for content_type_id, pks in pks_by_content_type.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            if model is None:
+                continue
+
+            models[content_type_id] = model
+            queryset = self.get_index_queryset(index.index_name, model).filter(pk__in=pks)
+            if isinstance(getattr(model, 'ALGOLIA_SHOULD_INDEX', None), basestring):
+                existing_keys.update(
+                    get_instance_key(instance) for instance in filter_indexable(model, queryset)
+                )
+            else:
+                existing_keys.update(
+                    get_instance_key(model(pk=pk)) for pk in queryset.values_list('pk', flat=True)
+                )
+
+        orphan_object_ids = []
+        orphan_algolia_index_ids = set()
+
+        for object_id in object_ids:
+            algolia_index_id, _, position = object_id.partition('-')
+            algolia_index = None
+            if algolia_index_id.isdigit():
+                algolia_index = algolia_indexes.get(int(algolia_index_id))
+
+            if algolia_index is None:
+                orphan_object_ids.append(object_id)
+                continue
+
+            if algolia_index.get_key() not in existing_keys:
+                orphan_object_ids.append(object_id)
+                orphan_algolia_index_ids.add(algolia_index.id)
+                continue
+
+            if get_split_field(models[algolia_index.content_type_id]):
+                chunks_number = len(algolia_index.get_chunks())
+                is_orphan = not position.isdigit() or int(position) >= chunks_number
+            else:
+                is_orphan = bool(position)
+
+            if is_orphan:
+                orphan_object_ids.append(object_id)
+
+        return orphan_object_ids, list(orphan_algolia_index_ids)
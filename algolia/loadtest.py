@@ -0,0 +1,476 @@
+# -*- coding: utf-8 -*-
+import copy
+import json
+import random
+import threading
+import time
+import urllib
+import urlparse
+from collections import OrderedDict
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+import urllib3
+from algoliasearch import algoliasearch
+
+__all__ = ['StubAlgoliaServer', 'StubPoolManager', 'LoadTestWorker', 'format_report']
+
+OPERATIONS = ('create', 'update', 'delete', 'search')
+
+REPORT_HEADER = '{0:<10} {1:>7} {2:>8} {3:>8} {4:>8} {5:>8} {6:>8} {7:>10} {8:>7}'
+REPORT_LINE = '{0:<10} {1:>7} {2:>8.1f} {3:>8.1f} {4:>8.1f} {5:>8.1f} {6:>8.1f} {7:>10.1f} {8:>7}'
+
+
+class StubAlgoliaAPI(object):
+    """
+    In-memory stand-in for the REST API of Algolia, implementing the calls made
+    by the indexer: objects, batches, searches, browsing, settings and clearing.
+    The number of calls is counted by kind.
+    """
+
+    def __init__(self):
+        self.indexes = {}
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def get_index(self, name):
+        # The records are returned in their order of insertion
+        return self.indexes.setdefault(name, OrderedDict())
+
+    def count(self, kind):
+        self.calls[kind] = self.calls.get(kind, 0) + 1
+
+    def call(self, method, path, params, body):
+        """Returns the (status, content) response of a call to the API"""
+        parts = [urllib.unquote(part) for part in path.strip('/').split('/')]
+        if parts[:2] != ['1', 'indexes'] or len(parts) < 3:
+            return 404, {'message': 'Unknown path {0}'.format(path), 'status': 404}
+
+        name, rest = parts[2], parts[3:]
+
+        with self.lock:
+            if name == '*' and rest == ['objects']:
+                self.count('get_objects')
+                return 200, self.get_objects(body['requests'])
+
+            index = self.get_index(name)
+
+            if not rest and method == 'GET':
+                self.count('search')
+                return 200, self.search(index, params)
+            if rest == ['batch'] and method == 'POST':
+                self.count('batch')
+                return 200, self.batch(index, body['requests'])
+            if rest == ['browse'] and method == 'GET':
+                self.count('browse')
+                return 200, self.browse(index, params)
+            if rest == ['settings']:
+                self.count('settings')
+                return 200, {'taskID': 1}
+            if rest == ['clear'] and method == 'POST':
+                self.count('clear')
+                index.clear()
+                return 200, {'taskID': 1}
+
+            if len(rest) == 1 and method == 'PUT':
+                self.count('save_object')
+                index[rest[0]] = dict(body, objectID=rest[0])
+                return 200, {'taskID': 1, 'objectID': rest[0]}
+            if len(rest) == 1 and method == 'DELETE':
+                self.count('delete_object')
+                index.pop(rest[0], None)
+                return 200, {'taskID': 1, 'objectID': rest[0]}
+            if rest[1:] == ['partial'] and method == 'POST':
+                self.count('partial_update_object')
+                index.setdefault(rest[0], {'objectID': rest[0]}).update(body)
+                return 200, {'taskID': 1, 'objectID': rest[0]}
+
+        return 404, {'message': 'Unknown call {0} {1}'.format(method, path), 'status': 404}
+
+    def get_objects(self, requests):
+        return {'results': [
+            self.get_index(request['indexName']).get(unicode(request['objectID']))
+            for request in requests
+        ]}
+
+    def batch(self, index, requests):
+        object_ids = []
+
+        for request in requests:
+            body = request.get('body') or {}
+            object_id = unicode(request.get('objectID', body.get('objectID', len(index))))
+            object_ids.append(object_id)
+
+            if request['action'] in ('addObject', 'updateObject'):
+                index[object_id] = dict(body, objectID=object_id)
+            elif request['action'] == 'partialUpdateObject':
+                index.setdefault(object_id, {'objectID': object_id}).update(body)
+            elif request['action'] == 'deleteObject':
+                index.pop(object_id, None)
+
+        return {'taskID': 1, 'objectIDs': object_ids}
+
+    def get_page(self, records, page, hits_per_page):
+        return {
+            'hits': records[page * hits_per_page:(page + 1) * hits_per_page],
+            'nbHits': len(records),
+            'page': page,
+            'nbPages': (len(records) + hits_per_page - 1) // hits_per_page,
+            'hitsPerPage': hits_per_page,
+        }
+
+    def search(self, index, params):
+        """Returns the records which contain the text of the query in any attribute"""
+        text = params.get('query', u'').lower()
+        records = [
+            record for record in index.values()
+            if text in json.dumps(record, ensure_ascii=False).lower()
+        ]
+        response = self.get_page(
+            records,
+            int(params.get('page', 0)),
+            int(params.get('hitsPerPage', 20)),
+        )
+        response.update(query=text, processingTimeMS=1)
+        return response
+
+    def browse(self, index, params):
+        return self.get_page(
+            index.values(),
+            int(params.get('page', 0)),
+            int(params.get('hitsPerPage', 1000)),
+        )
+
+
+class StubAlgoliaHandler(BaseHTTPRequestHandler):
+    """Answers the calls of the Algolia client, after the latency of the server"""
+
+    # Keeps the connections alive, like Algolia API
+    protocol_version = 'HTTP/1.1'
+    # The headers and the body are written separately, without waiting for an ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.handle_call('GET')
+
+    def do_POST(self):
+        self.handle_call('POST')
+
+    def do_PUT(self):
+        self.handle_call('PUT')
+
+    def do_DELETE(self):
+        self.handle_call('DELETE')
+
+    def handle_call(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+
+        url = urlparse.urlparse(self.path)
+        params = dict(urlparse.parse_qsl(url.query))
+        params = dict((key, value.decode('utf-8')) for key, value in params.items())
+
+        self.server.wait()
+
+        if self.server.is_rate_limited():
+            status, content = 429, {'message': 'Too many requests', 'status': 429}
+        else:
+            try:
+                status, content = self.server.api.call(method, url.path, params, body)
+            except Exception as e:
+                # A server error would make the client try the other hosts
+                status, content = 400, {'message': repr(e), 'status': 400}
+
+        data = json.dumps(content)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubAlgoliaServer(ThreadingMixIn, HTTPServer):
+    """
+    Local HTTP server which stands in for Algolia API, with an injectable
+    latency (in seconds) and a rate of "429 Too many requests" responses.
+
+    Use:
+        server = StubAlgoliaServer(latency=0.05, jitter=0.02, rate_limit=0.01)
+        server.start()
+        algoliasearch.POOL_MANAGER = StubPoolManager(*server.server_address)
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0, jitter=0, rate_limit=0):
+        HTTPServer.__init__(self, address, StubAlgoliaHandler)
+        self.api = StubAlgoliaAPI()
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+
+    def wait(self):
+        latency = self.latency + random.uniform(-self.jitter, self.jitter)
+        if latency > 0:
+            time.sleep(latency)
+
+    def is_rate_limited(self):
+        return self.rate_limit > 0 and random.random() < self.rate_limit
+
+    def start(self):
+        """Serves the calls in a background thread"""
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class StubPoolManager(urllib3.PoolManager):
+    """
+    Sends all the HTTPS calls of the Algolia client to a stub server in plain HTTP.
+    It replaces `algoliasearch.POOL_MANAGER`, which the client uses for every host.
+    """
+
+    def __init__(self, host, port, **kwargs):
+        super(StubPoolManager, self).__init__(**kwargs)
+        self.stub_host = host
+        self.stub_port = port
+
+    def connection_from_host(self, host, port=None, scheme='http', **kwargs):
+        return super(StubPoolManager, self).connection_from_host(
+            self.stub_host,
+            self.stub_port,
+            'http',
+            **kwargs
+        )
+
+
+def get_error_name(error):
+    """Returns a short name of the error of an operation, to count them by kind"""
+    if isinstance(error, algoliasearch.AlgoliaException) and 'Too many requests' in str(error):
+        return 'rate limited'
+    return error.__class__.__name__
+
+
+class LoadTestWorker(object):
+    """
+    Runs a random sequence of operations on a model, from one thread,
+    and records the latency, the number of database queries and the error
+    of each operation as a {operation: [(seconds, queries, error)]} dict.
+
+    The created instances are copies of `templates`. Only these copies are
+    updated and deleted, and the remaining ones are deleted at the end.
+    With a `batch_size` greater than 1, the writes are grouped into atomic
+    blocks, whose commit is recorded as a 'commit' operation.
+    """
+
+    def __init__(self, indexer, model, templates, weights, operations=100, batch_size=1,
+                 seed=None):
+        self.indexer = indexer
+        self.model = model
+        self.templates = templates
+        self.weights = weights
+        self.operations = operations
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.copies = []
+        self.samples = dict((operation, []) for operation in OPERATIONS + ('commit',))
+
+    def choose_operation(self):
+        position = self.random.uniform(0, sum(self.weights.values()))
+
+        for operation in OPERATIONS:
+            position -= self.weights.get(operation, 0)
+            if position <= 0 and self.weights.get(operation, 0):
+                return operation
+        return 'search'
+
+    def create(self):
+        instance = copy.copy(self.random.choice(self.templates))
+        instance.pk = None
+        # Kept even if the indexing fails after the insertion, to be deleted later
+        self.copies.append(instance)
+        instance.save()
+
+    def update(self):
+        if not self.copies:
+            return self.create()
+        self.random.choice(self.copies).save()
+
+    def delete(self):
+        if not self.copies:
+            return self.create()
+        position = self.random.randrange(len(self.copies))
+        self.copies[position].delete()
+        self.copies.pop(position)
+
+    def delete_copies(self, attempts=10):
+        """Deletes the remaining copies, which may fail under load"""
+        for instance in self.copies:
+            for attempt in range(attempts):
+                if instance.pk is None:
+                    break
+                try:
+                    instance.delete()
+                except Exception:
+                    if attempt == attempts - 1:
+                        raise
+
+    def search(self):
+        from .utils import get_shard_field, get_shard
+
+        template = self.random.choice(self.templates)
+        words = unicode(template).split() or [u'']
+        kwargs = {}
+        if get_shard_field(template):
+            kwargs['shard'] = get_shard(template)
+
+        self.indexer.search(self.model, self.random.choice(words), **kwargs)
+
+    def measure(self, operation, function):
+        """Runs an operation, records it and returns its error"""
+        from django.db import connection
+
+        del connection.queries[:]
+        start = time.time()
+        error = None
+
+        try:
+            function()
+        except Exception as e:
+            error = e
+
+        self.samples[operation].append((
+            time.time() - start,
+            len(connection.queries),
+            get_error_name(error) if error else None,
+        ))
+        return error
+
+    def run(self):
+        from django.db import connection
+
+        # The queries are recorded even if DEBUG is False
+        connection.use_debug_cursor = True
+
+        try:
+            for start in range(0, self.operations, self.batch_size):
+                operations = [
+                    self.choose_operation()
+                    for i in range(min(self.batch_size, self.operations - start))
+                ]
+
+                if self.batch_size == 1:
+                    self.measure(operations[0], getattr(self, operations[0]))
+                else:
+                    self.run_batch(operations)
+
+            self.delete_copies()
+        finally:
+            connection.close()
+
+        return self.samples
+
+    def run_batch(self, operations):
+        """Runs operations in an atomic block, which is rolled back after an error"""
+        from django.db import transaction
+
+        atomic = transaction.atomic()
+        atomic.__enter__()
+        # The deletion resets the primary keys of the instances
+        copies = [(instance, instance.pk) for instance in self.copies]
+
+        for operation in operations:
+            error = self.measure(operation, getattr(self, operation))
+            if error is not None:
+                atomic.__exit__(type(error), error, None)
+                for instance, pk in copies:
+                    instance.pk = pk
+                self.copies = [instance for instance, pk in copies]
+                return
+
+        self.measure('commit', lambda: atomic.__exit__(None, None, None))
+
+
+def get_percentile(values, percentile):
+    """Returns the nearest-rank percentile of a list of values
+
+    Tests:
+        >>> get_percentile(range(1, 101), 95)
+        95
+        >>> get_percentile([3, 1, 2], 50)
+        2
+        >>> get_percentile([], 50)
+        0
+    """
+    if not values:
+        return 0
+
+    values = sorted(values)
+    rank = max(int(round(percentile / 100.0 * len(values))), 1)
+    return values[rank - 1]
+
+
+def merge_samples(results):
+    """Merges the {operation: samples} dicts of several workers"""
+    samples = {}
+    for result in results:
+        for operation, operation_samples in result.items():
+            samples.setdefault(operation, []).extend(operation_samples)
+    return samples
+
+
+def format_report(samples, duration, api_calls=None):
+    """
+    Returns the lines of a report of the throughput, the latency percentiles,
+    the database queries and the errors by operation
+    """
+    lines = [REPORT_HEADER.format(
+        'operation', 'count', 'ops/s', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms', 'queries/op',
+        'errors',
+    )]
+    errors = {}
+
+    for operation in OPERATIONS + ('commit',):
+        operation_samples = samples.get(operation)
+        if not operation_samples:
+            continue
+
+        latencies = [sample[0] * 1000 for sample in operation_samples]
+        queries = [sample[1] for sample in operation_samples]
+        operation_errors = [sample[2] for sample in operation_samples if sample[2]]
+
+        for error in operation_errors:
+            errors[(operation, error)] = errors.get((operation, error), 0) + 1
+
+        lines.append(
+            REPORT_LINE.format(
+                operation,
+                len(operation_samples),
+                float(len(operation_samples)) / duration if duration else 0,
+                get_percentile(latencies, 50),
+                get_percentile(latencies, 95),
+                get_percentile(latencies, 99),
+                max(latencies),
+                float(sum(queries)) / len(queries),
+                len(operation_errors),
+            )
+        )
+
+    for (operation, error), count in sorted(errors.items()):
+        lines.append('{0} errors: {1} {2}'.format(operation, count, error))
+
+    if api_calls:
+        lines.append('API calls: {0}'.format(', '.join(
+            '{0} {1}'.format(count, kind) for kind, count in sorted(api_calls.items())
+        )))
+
+    return lines
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from optparse import make_option
+
+from django.conf import settings
+from django.db.models.loading import get_model
+from django.core.management.base import BaseCommand, CommandError
+
+
+def find_model(model_name):
+    """Returns the model of the installed applications which has a name"""
+    model = None
+    # @todo: Find a better way to retrieve django's apps
+    apps = [app.split('.')[-1] for app in settings.INSTALLED_APPS]
+
+    for app in apps:
+        fetched_model = get_model(app, model_name)
+
+        if fetched_model:
+            model = fetched_model
+
+    if not model:
+        raise CommandError('Unable to find "{}" model to all applications : {}'.format(
+            model_name,
+            ', '.join(apps),
+        ))
+
+    return model
+
+
+class IndexCommand(BaseCommand):
+    """Base class of the commands which work on an index specified by a model or a name"""
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--index-name',
+            action='store',
+            dest='index_name',
+            type='string',
+            default='',
+            help='Name of the index',
+        ),
+        make_option(
+            '--model',
+            action='store',
+            dest='model_name',
+            type='string',
+            default='',
+            help='Name of associated model for index',
+        ),
+        make_option(
+            '--shard',
+            action='store',
+            dest='shard',
+            type='string',
+            default='',
+            help='Shard of the model, by default all the shards of a sharded model',
+        ),
+        make_option(
+            '--chunk-size',
+            action='store',
+            dest='chunk_size',
+            type='int',
+            default=1000,
+            help='Number of instances processed at once',
+        ),
+    )
+
+    def get_indexes(self, indexer, options):
+        """
+        Returns the indexes specified by the --model or --index-name options:
+        one index by shard for a sharded model, unless --shard is set
+        """
+        index_name = options['index_name']
+        model_name = options['model_name']
+
+        if not index_name and not model_name:
+            raise CommandError('Invalid index. Use the flag --model=MyModel or '
+                               '--index-name=IndexName to specify it.')
+
+        if index_name and model_name:
+            raise CommandError('Invalid index. You can not specify index name and model.')
+
+        if model_name:
+            model = find_model(model_name)
+
+            if options['shard']:
+                try:
+                    return [indexer.get_index(model=model, shard=options['shard'])]
+                except ValueError as e:
+                    raise CommandError(e)
+
+            return indexer.get_indexes(model)
+
+        return [indexer.get_index(index_name=index_name, with_suffix=False)]
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from multiprocessing import Process, Queue
+from optparse import make_option
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.core.management.base import BaseCommand, CommandError
+
+from algoliasearch import algoliasearch
+
+import algolia
+from algolia import AlgoliaIndexer
+from algolia.loadtest import (
+    OPERATIONS, StubAlgoliaServer, StubPoolManager, LoadTestWorker, format_report, merge_samples,
+)
+from algolia.management.base import find_model
+from algolia.utils import import_class, get_signal_processor_class
+
+# Number of instances copied by the created instances
+TEMPLATES_COUNT = 100
+
+
+def parse_mix(mix):
+    """Returns the {operation: weight} dict of a "create=20,update=40,..." option"""
+    weights = {}
+
+    for item in mix.split(','):
+        operation, _, weight = item.partition('=')
+        operation = operation.strip()
+
+        if operation not in OPERATIONS:
+            raise CommandError('Unknown operation "{}", use {}.'.format(
+                operation,
+                ', '.join(OPERATIONS),
+            ))
+        try:
+            weights[operation] = float(weight)
+        except ValueError:
+            raise CommandError('Invalid weight of {}: "{}"'.format(operation, weight))
+
+    if not sum(weights.values()) > 0:
+        raise CommandError('The mix of operations is empty.')
+
+    return weights
+
+
+def run_threads(indexer, model, templates, weights, options, seed=0):
+    """Runs the workers in threads and returns their merged samples"""
+    workers = [
+        LoadTestWorker(
+            indexer,
+            model,
+            templates,
+            weights,
+            operations=options['operations'],
+            batch_size=options['batch_size'],
+            seed=seed + i,
+        )
+        for i in range(options['threads'])
+    ]
+    results = []
+    threads = [
+        threading.Thread(target=lambda worker=worker: results.append(worker.run()))
+        for worker in workers
+    ]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return merge_samples(results)
+
+
+def run_process(queue, indexer, model, templates, weights, options, seed):
+    """Runs the workers of a child process and sends their samples to the parent"""
+    # The HTTP connections opened by the parent process can not be shared
+    algoliasearch.POOL_MANAGER.clear()
+    samples = {}
+
+    try:
+        samples = run_threads(indexer, model, templates, weights, options, seed)
+    finally:
+        # The parent process waits for the samples of each child
+        queue.put(samples)
+
+
+class Command(BaseCommand):
+    help = ('Measures concurrent saves, deletions and searches of a model, '
+            'indexed by the signal processor in a local stub of Algolia API. '
+            'Instances are created and deleted: use a disposable database, '
+            'and confirm it with --allow-writes.')
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--model',
+            action='store',
+            dest='model_name',
+            type='string',
+            default='',
+            help='Name of the model, which needs existing instances to copy',
+        ),
+        make_option(
+            '--threads',
+            action='store',
+            dest='threads',
+            type='int',
+            default=4,
+            help='Number of threads by process',
+        ),
+        make_option(
+            '--processes',
+            action='store',
+            dest='processes',
+            type='int',
+            default=1,
+            help='Number of processes',
+        ),
+        make_option(
+            '--operations',
+            action='store',
+            dest='operations',
+            type='int',
+            default=100,
+            help='Number of operations by thread',
+        ),
+        make_option(
+            '--mix',
+            action='store',
+            dest='mix',
+            type='string',
+            default='create=20,update=40,delete=10,search=30',
+            help='Weights of the operations',
+        ),
+        make_option(
+            '--batch-size',
+            action='store',
+            dest='batch_size',
+            type='int',
+            default=1,
+            help='Number of operations by transaction',
+        ),
+        make_option(
+            '--split-size',
+            action='store',
+            dest='split_size',
+            type='int',
+            default=0,
+            help='Overrides the SPLIT_SIZE setting',
+        ),
+        make_option(
+            '--signal-processor',
+            action='store',
+            dest='signal_processor',
+            type='string',
+            default='',
+            help='Path of the signal processor class, by default the SIGNAL_PROCESSOR setting',
+        ),
+        make_option(
+            '--latency',
+            action='store',
+            dest='latency',
+            type='float',
+            default=0,
+            help='Latency of the stub API, in milliseconds',
+        ),
+        make_option(
+            '--jitter',
+            action='store',
+            dest='jitter',
+            type='float',
+            default=0,
+            help='Random variation of the latency, in milliseconds',
+        ),
+        make_option(
+            '--rate-limit',
+            action='store',
+            dest='rate_limit',
+            type='float',
+            default=0,
+            help='Fraction of the calls answered by "429 Too many requests"',
+        ),
+        make_option(
+            '--allow-writes',
+            action='store_true',
+            dest='allow_writes',
+            default=False,
+            help='Confirms that instances can be created and deleted in the default database',
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if not options['model_name']:
+            raise CommandError('Invalid model. Use the flag --model=MyModel to specify it.')
+        if options['threads'] < 1 or options['processes'] < 1 or options['batch_size'] < 1:
+            raise CommandError('The numbers of threads, processes and '
+                               'operations by transaction must be positive.')
+
+        if not options['allow_writes']:
+            raise CommandError(
+                'The load test creates and deletes instances in the database {}. '
+                'Run it against a disposable database, with the flag --allow-writes.'.format(
+                    connections[DEFAULT_DB_ALIAS].settings_dict['NAME'],
+                )
+            )
+
+        model = find_model(options['model_name'])
+        weights = parse_mix(options['mix'])
+        if options['signal_processor']:
+            signal_processor_class = import_class(options['signal_processor'])
+        else:
+            signal_processor_class = get_signal_processor_class()
+
+        templates = list(model.objects.all()[:TEMPLATES_COUNT])
+        if not templates:
+            raise CommandError('The load test copies existing instances of {}, '
+                               'there are none.'.format(model.__name__))
+
+        server = StubAlgoliaServer(
+            latency=options['latency'] / 1000.0,
+            jitter=options['jitter'] / 1000.0,
+            rate_limit=options['rate_limit'],
+        )
+        server.start()
+        pool_manager = algoliasearch.POOL_MANAGER
+        algoliasearch.POOL_MANAGER = StubPoolManager(*server.server_address)
+
+        configs = dict(getattr(settings, 'ALGOLIA', {}), TEST_MODE=False, QUIET=True)
+        configs.setdefault('API_KEY', 'load-test')
+        configs.setdefault('API_SECRET', 'load-test')
+        if options['split_size']:
+            configs['SPLIT_SIZE'] = options['split_size']
+
+        signal_processor = signal_processor_class(indexer=AlgoliaIndexer(configs))
+
+        # Only the tested signal processor sends the operations to the stub,
+        # the signals of the global one are connected again at the end
+        global_processor = algolia.signal_processor
+        restore_global_processor = False
+        if hasattr(global_processor, 'teardown') and global_processor.indexer.is_valid:
+            # Set up like in BaseSignalProcessor.__init__, unless in test mode
+            restore_global_processor = not global_processor.indexer.configs.get('TEST_MODE', False)
+        if restore_global_processor:
+            global_processor.teardown()
+
+        self.stdout.write('Running {} operations on {} with {} x {} threads ({}) ...'.format(
+            options['operations'] * options['threads'] * options['processes'],
+            model.__name__,
+            options['processes'],
+            options['threads'],
+            signal_processor_class.__name__,
+        ))
+
+        try:
+            start = time.time()
+            samples = self.run(signal_processor.indexer, model, templates, weights, options)
+            duration = time.time() - start
+        finally:
+            signal_processor.teardown()
+            algoliasearch.POOL_MANAGER = pool_manager
+            server.stop()
+            if restore_global_processor:
+                global_processor.setup()
+
+        for line in format_report(samples, duration, server.api.calls):
+            self.stdout.write(line)
+
+    def run(self, indexer, model, templates, weights, options):
+        """Runs the threads in the current process, or in child processes"""
+        if options['processes'] == 1:
+            return run_threads(indexer, model, templates, weights, options)
+
+        # The database connections can not be shared with the child processes
+        for connection in connections.all():
+            connection.close()
+
+        queue = Queue()
+        processes = [
+            Process(
+                target=run_process,
+                args=(queue, indexer, model, templates, weights, options,
+                      i * options['threads']),
+            )
+            for i in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+
+        # The samples are received before joining, a full pipe would block the processes
+        results = [queue.get() for process in processes]
+        for process in processes:
+            process.join()
+
+        return merge_samples(results)
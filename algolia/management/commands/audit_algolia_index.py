@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from optparse import make_option
+
+from algolia import AlgoliaIndexer
+from algolia.management.base import IndexCommand
+
+
+class Command(IndexCommand):
+
+    option_list = IndexCommand.option_list + (
+        make_option(
+            '--repair',
+            action='store_true',
+            dest='repair',
+            default=False,
+            help='Fix the missing, stale and orphaned records',
+        ),
+    )
+
+    def handle(self, *args, **options):
+        indexer = AlgoliaIndexer()
+
+        for index in self.get_indexes(indexer, options):
+            self.audit_index(indexer, index, options)
+
+    def audit_index(self, indexer, index, options):
+        counts = {'missing': 0, 'stale': 0, 'orphaned': 0}
+
+        self.stdout.write('Auditing Algolia index {} ...'.format(index.index_name))
+        differences = indexer.audit_index(
+            index,
+            chunk_size=options['chunk_size'],
+            repair=options['repair'],
+        )
+
+        for status, identifier in differences:
+            counts[status] += 1
+            self.stdout.write('{0}: {1}'.format(status, identifier))
+
+        self.stdout.write('{missing} missing, {stale} stale, {orphaned} orphaned'.format(**counts))
+        if options['repair']:
+            self.stdout.write('All differences have been repaired.')
@@ -1,71 +1,113 @@
 # -*- coding: utf-8 -*-
+from multiprocessing import Process
 from optparse import make_option
 
-from django.conf import settings
-from django.db.models.loading import get_model
-from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.core.management.base import CommandError
+
+from algoliasearch import algoliasearch
 
 from algolia import AlgoliaIndexer
+from algolia.models import AlgoliaRebuild
+from algolia.management.base import IndexCommand
+
+# Seconds between two displays of the progress
+PROGRESS_INTERVAL = 2
+
+
+def run_worker(rebuild_id, chunk_size):
+    """Processes the checkpoints of a rebuild in a child process"""
+    # The HTTP connections opened by the parent process can not be shared
+    algoliasearch.POOL_MANAGER.clear()
+
+    rebuild = AlgoliaRebuild.objects.get(pk=rebuild_id)
+    AlgoliaIndexer().run_rebuild(rebuild, chunk_size)
 
 
-class Command(BaseCommand):
+class Command(IndexCommand):
 
-    option_list = BaseCommand.option_list + (
+    option_list = IndexCommand.option_list + (
         make_option(
-            '--index-name',
+            '--workers',
             action='store',
-            dest='index_name',
-            type='string',
-            default='',
-            help='Name of the index to rebuild',
+            dest='workers',
+            type='int',
+            default=1,
+            help='Number of processes which index the models',
         ),
-    )
-
-    option_list = option_list + (
         make_option(
-            '--model',
-            action='store',
-            dest='model_name',
-            type='string',
-            default='',
-            help='Name of associated model for index to rebuild',
+            '--resume',
+            action='store_true',
+            dest='resume',
+            default=False,
+            help='Continue the last unfinished rebuild from its checkpoints',
         ),
     )
 
     def handle(self, *args, **options):
-
-        index_name = options['index_name']
-        model_name = options['model_name']
-
-        if not index_name and not model_name:
-            raise CommandError('Invalid index. Use the flag --model=MyModel or '
-                               '--index-name=IndexName to specify it.')
-
-        if index_name and model_name:
-            raise CommandError('Invalid index. You can not specify index name and model.')
-
         indexer = AlgoliaIndexer()
-
-        if model_name:
-            model = None
-            # @todo: Find a better way to retrieve django's apps
-            apps = [app.split('.')[-1] for app in settings.INSTALLED_APPS]
-
-            for app in apps:
-                fetched_model = get_model(app, model_name)
-
-                if fetched_model:
-                    model = fetched_model
-
-            if not model:
-                raise CommandError('Unable to find "{}" model to all applications : {}'.format(
-                    model_name,
-                    ', '.join(apps),
+        indexes = self.get_indexes(indexer, options)
+
+        for index in indexes:
+            if options['resume']:
+                rebuild = indexer.resume_rebuild(index)
+                if rebuild is None:
+                    message = 'There is no unfinished rebuild of {} to resume.'.format(
+                        index.index_name,
+                    )
+                    # The other shards of a sharded model can still be resumed
+                    if len(indexes) == 1:
+                        raise CommandError(message)
+                    self.stdout.write(message)
+                    continue
+                self.stdout.write('Resuming indexing of {} to Algolia API ...'.format(
+                    index.index_name,
                 ))
-
-            index = indexer.get_index(model=model)
-        else:
-            index = indexer.get_index(index_name=index_name, with_suffix=False)
-
-        self.stdout.write('Indexing to Algolia API ...')
-        indexer.rebuild_index(index)
+            else:
+                self.stdout.write('Indexing {} to Algolia API ...'.format(index.index_name))
+                rebuild = indexer.start_rebuild(index, workers=options['workers'])
+
+            self.run_rebuild(rebuild, options)
+
+    def run_rebuild(self, rebuild, options):
+        """Runs a rebuild in worker processes and displays its progress"""
+        if options['workers'] == 1:
+            # A single worker runs in the current process, so its errors are displayed
+            AlgoliaIndexer().run_rebuild(
+                rebuild,
+                options['chunk_size'],
+                progress=self.display_progress,
+                progress_interval=PROGRESS_INTERVAL,
+            )
+            self.display_progress(rebuild)
+            return
+
+        # The database connections can not be shared with the child processes
+        for connection in connections.all():
+            connection.close()
+
+        workers = [
+            Process(target=run_worker, args=(rebuild.pk, options['chunk_size']))
+            for i in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        alive_workers = workers
+        while alive_workers:
+            alive_workers[0].join(PROGRESS_INTERVAL)
+            alive_workers = [worker for worker in workers if worker.is_alive()]
+
+            if alive_workers:
+                self.display_progress(rebuild)
+
+        rebuild = AlgoliaRebuild.objects.get(pk=rebuild.pk)
+        if rebuild.status != AlgoliaRebuild.STATUS_DONE:
+            raise CommandError('The rebuild has been interrupted, '
+                               'run the command again with --resume to continue it.')
+
+        self.stdout.write(unicode(rebuild))
+
+    def display_progress(self, rebuild):
+        """Displays the progress of a rebuild, updated by all its workers"""
+        self.stdout.write(unicode(AlgoliaRebuild.objects.get(pk=rebuild.pk)))
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding field 'AlgoliaIndex.chunks'
+        db.add_column(u'algolia_algoliaindex', 'chunks',
+                      self.gf('django.db.models.fields.TextField')(default='', blank=True),
+                      keep_default=False)
+
+
+    def backwards(self, orm):
+        # Deleting field 'AlgoliaIndex.chunks'
+        db.delete_column(u'algolia_algoliaindex', 'chunks')
+
+
+    models = {
+        u'algolia.algoliaindex': {
+            'Meta': {'object_name': 'AlgoliaIndex'},
+            'chunks': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'index': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'instance_identifier': ('django.db.models.fields.CharField', [], {'max_length': '1000'})
+        }
+    }
+
+    complete_apps = ['algolia']
\ No newline at end of file
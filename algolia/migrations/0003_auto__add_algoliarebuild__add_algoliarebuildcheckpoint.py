@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'AlgoliaRebuild'
+        db.create_table(u'algolia_algoliarebuild', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('index', self.gf('django.db.models.fields.CharField')(max_length=255, db_index=True)),
+            ('status', self.gf('django.db.models.fields.CharField')(default='running', max_length=20)),
+            ('rows_total', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('rows_scanned', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('rows_indexed', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('rows_skipped', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('started_at', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.now)),
+            ('updated_at', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.now)),
+        ))
+        db.send_create_signal(u'algolia', ['AlgoliaRebuild'])
+
+        # Adding model 'AlgoliaRebuildCheckpoint'
+        db.create_table(u'algolia_algoliarebuildcheckpoint', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('rebuild', self.gf('django.db.models.fields.related.ForeignKey')(related_name='checkpoints', to=orm['algolia.AlgoliaRebuild'])),
+            ('model', self.gf('django.db.models.fields.CharField')(max_length=255)),
+            ('start_pk', self.gf('django.db.models.fields.CharField')(max_length=255, null=True)),
+            ('end_pk', self.gf('django.db.models.fields.CharField')(max_length=255, null=True)),
+            ('last_pk', self.gf('django.db.models.fields.CharField')(max_length=255, null=True)),
+            ('status', self.gf('django.db.models.fields.CharField')(default='pending', max_length=20)),
+            ('rows_total', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('rows_scanned', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('rows_indexed', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+        ))
+        db.send_create_signal(u'algolia', ['AlgoliaRebuildCheckpoint'])
+
+
+    def backwards(self, orm):
+        # Deleting model 'AlgoliaRebuildCheckpoint'
+        db.delete_table(u'algolia_algoliarebuildcheckpoint')
+
+        # Deleting model 'AlgoliaRebuild'
+        db.delete_table(u'algolia_algoliarebuild')
+
+
+    models = {
+        u'algolia.algoliaindex': {
+            'Meta': {'object_name': 'AlgoliaIndex'},
+            'chunks': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'index': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'instance_identifier': ('django.db.models.fields.CharField', [], {'max_length': '1000'})
+        },
+        u'algolia.algoliarebuild': {
+            'Meta': {'object_name': 'AlgoliaRebuild'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'index': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'rows_indexed': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_scanned': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_skipped': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_total': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'started_at': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'status': ('django.db.models.fields.CharField', [], {'default': "'running'", 'max_length': '20'}),
+            'updated_at': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'})
+        },
+        u'algolia.algoliarebuildcheckpoint': {
+            'Meta': {'object_name': 'AlgoliaRebuildCheckpoint'},
+            'end_pk': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_pk': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'rebuild': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'checkpoints'", 'to': u"orm['algolia.AlgoliaRebuild']"}),
+            'rows_indexed': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_scanned': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_total': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'start_pk': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True'}),
+            'status': ('django.db.models.fields.CharField', [], {'default': "'pending'", 'max_length': '20'})
+        }
+    }
+
+    complete_apps = ['algolia']
\ No newline at end of file
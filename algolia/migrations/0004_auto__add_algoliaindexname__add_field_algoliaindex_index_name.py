@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'AlgoliaIndexName'
+        db.create_table(u'algolia_algoliaindexname', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('name', self.gf('django.db.models.fields.CharField')(unique=True, max_length=255)),
+        ))
+        db.send_create_signal(u'algolia', ['AlgoliaIndexName'])
+
+        # Adding field 'AlgoliaIndex.index_name'
+        db.add_column(u'algolia_algoliaindex', 'index_name',
+                      self.gf('django.db.models.fields.related.ForeignKey')(related_name='algolia_indexes', null=True, to=orm['algolia.AlgoliaIndexName']),
+                      keep_default=False)
+
+        # Adding field 'AlgoliaIndex.content_type'
+        db.add_column(u'algolia_algoliaindex', 'content_type',
+                      self.gf('django.db.models.fields.related.ForeignKey')(to=orm['contenttypes.ContentType'], null=True),
+                      keep_default=False)
+
+        # Adding field 'AlgoliaIndex.object_id'
+        db.add_column(u'algolia_algoliaindex', 'object_id',
+                      self.gf('django.db.models.fields.BigIntegerField')(null=True),
+                      keep_default=False)
+
+        # Adding field 'AlgoliaIndex.object_key'
+        db.add_column(u'algolia_algoliaindex', 'object_key',
+                      self.gf('django.db.models.fields.CharField')(max_length=255, null=True),
+                      keep_default=False)
+
+
+    def backwards(self, orm):
+        # Deleting field 'AlgoliaIndex.object_key'
+        db.delete_column(u'algolia_algoliaindex', 'object_key')
+
+        # Deleting field 'AlgoliaIndex.object_id'
+        db.delete_column(u'algolia_algoliaindex', 'object_id')
+
+        # Deleting field 'AlgoliaIndex.content_type'
+        db.delete_column(u'algolia_algoliaindex', 'content_type_id')
+
+        # Deleting field 'AlgoliaIndex.index_name'
+        db.delete_column(u'algolia_algoliaindex', 'index_name_id')
+
+        # Deleting model 'AlgoliaIndexName'
+        db.delete_table(u'algolia_algoliaindexname')
+
+
+    models = {
+        u'algolia.algoliaindex': {
+            'Meta': {'object_name': 'AlgoliaIndex'},
+            'chunks': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']", 'null': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'index': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'index_name': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'algolia_indexes'", 'null': 'True', 'to': u"orm['algolia.AlgoliaIndexName']"}),
+            'instance_identifier': ('django.db.models.fields.CharField', [], {'max_length': '1000'}),
+            'object_id': ('django.db.models.fields.BigIntegerField', [], {'null': 'True'}),
+            'object_key': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True'})
+        },
+        u'algolia.algoliaindexname': {
+            'Meta': {'object_name': 'AlgoliaIndexName'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '255'})
+        },
+        u'algolia.algoliarebuild': {
+            'Meta': {'object_name': 'AlgoliaRebuild'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'index': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'rows_indexed': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_scanned': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_skipped': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_total': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'started_at': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'status': ('django.db.models.fields.CharField', [], {'default': "'running'", 'max_length': '20'}),
+            'updated_at': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'})
+        },
+        u'algolia.algoliarebuildcheckpoint': {
+            'Meta': {'object_name': 'AlgoliaRebuildCheckpoint'},
+            'end_pk': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_pk': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'rebuild': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'checkpoints'", 'to': u"orm['algolia.AlgoliaRebuild']"}),
+            'rows_indexed': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_scanned': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_total': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'start_pk': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True'}),
+            'status': ('django.db.models.fields.CharField', [], {'default': "'pending'", 'max_length': '20'})
+        },
+        u'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        }
+    }
+
+    complete_apps = ['algolia']
\ No newline at end of file
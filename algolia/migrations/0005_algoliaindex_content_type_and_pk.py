@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+import sys
+
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import DataMigration
+from django.db import connection, models
+
+INTEGER_FIELDS = (
+    'AutoField',
+    'IntegerField',
+    'BigIntegerField',
+    'SmallIntegerField',
+    'PositiveIntegerField',
+    'PositiveSmallIntegerField',
+)
+
+
+def has_integer_pk(model):
+    """Check if the primary key of a model is an integer, as when this migration was written"""
+    field = model._meta.pk
+
+    # Follows the parent links of multi-table inheritance
+    while field.rel:
+        field = field.rel.get_related_field()
+
+    return field.get_internal_type() in INTEGER_FIELDS
+
+
+class Migration(DataMigration):
+
+    def forwards(self, orm):
+        """
+        Converts the instance identifiers like app.Model.42 to a content type and a primary key.
+        Each statement updates all the rows of an index or of a model at once.
+        """
+        for name in orm.AlgoliaIndex.objects.values_list('index', flat=True).distinct():
+            index_name = orm.AlgoliaIndexName.objects.create(name=name)
+            orm.AlgoliaIndex.objects.filter(index=name).update(index_name=index_name)
+
+        # MySQL only casts to SIGNED
+        integer_type = 'SIGNED' if connection.vendor == 'mysql' else 'BIGINT'
+
+        # Only the models which have been indexed are converted
+        prefixes = set()
+        identifiers = orm.AlgoliaIndex.objects.values_list('instance_identifier', flat=True)
+        for identifier in identifiers.iterator():
+            prefixes.add('.'.join(identifier.split('.', 2)[:2]) + '.')
+
+        for prefix in sorted(prefixes):
+            app_label, model_name = prefix.split('.')[:2]
+            # The indexed models are not frozen, only the type of their primary key is read
+            model = models.get_model(app_label, model_name)
+            if model is None:
+                continue
+
+            content_type, created = orm['contenttypes.ContentType'].objects.get_or_create(
+                app_label=model._meta.app_label,
+                model=model._meta.object_name.lower(),
+                defaults={'name': model._meta.verbose_name_raw},
+            )
+            # The identifiers contain the name of the model class, and not its lowercase version
+            orm.AlgoliaIndex.objects.filter(
+                instance_identifier__startswith=prefix,
+            ).update(content_type=content_type)
+
+            if has_integer_pk(model):
+                value = 'CAST(SUBSTR(instance_identifier, %s) AS {0})'.format(integer_type)
+                column = 'object_id'
+            else:
+                value = 'SUBSTR(instance_identifier, %s)'
+                column = 'object_key'
+
+            db.execute(
+                'UPDATE algolia_algoliaindex SET {0} = {1} WHERE content_type_id = %s'.format(
+                    column,
+                    value,
+                ),
+                [len(prefix) + 1, content_type.id],
+            )
+
+        # The instances of the deleted models can not be found anymore
+        dropped = orm.AlgoliaIndex.objects.filter(content_type__isnull=True)
+        dropped_count = dropped.count()
+        if dropped_count:
+            # Displayed like the progress of South
+            sys.stdout.write(
+                ' - {0} Algolia index rows of models which no longer exist have been deleted, '
+                'their records are left on Algolia API: run audit_algolia_index --repair '
+                'to remove them.\n'.format(dropped_count)
+            )
+        dropped.delete()
+
+    def backwards(self, orm):
+        for index_name in orm.AlgoliaIndexName.objects.all():
+            orm.AlgoliaIndex.objects.filter(index_name=index_name).update(index=index_name.name)
+
+        for content_type in orm['contenttypes.ContentType'].objects.all():
+            model = models.get_model(content_type.app_label, content_type.model)
+            if model is None:
+                continue
+
+            prefix = '{0}.{1}.'.format(model._meta.app_label, model.__name__)
+            for algolia_index in orm.AlgoliaIndex.objects.filter(content_type=content_type):
+                if algolia_index.object_id is not None:
+                    pk = algolia_index.object_id
+                else:
+                    pk = algolia_index.object_key
+                algolia_index.instance_identifier = u'{0}{1}'.format(prefix, pk)
+                algolia_index.save()
+
+    models = {
+        u'algolia.algoliaindex': {
+            'Meta': {'object_name': 'AlgoliaIndex'},
+            'chunks': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']", 'null': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'index': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'index_name': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'algolia_indexes'", 'null': 'True', 'to': u"orm['algolia.AlgoliaIndexName']"}),
+            'instance_identifier': ('django.db.models.fields.CharField', [], {'max_length': '1000'}),
+            'object_id': ('django.db.models.fields.BigIntegerField', [], {'null': 'True'}),
+            'object_key': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True'})
+        },
+        u'algolia.algoliaindexname': {
+            'Meta': {'object_name': 'AlgoliaIndexName'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '255'})
+        },
+        u'algolia.algoliarebuild': {
+            'Meta': {'object_name': 'AlgoliaRebuild'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'index': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'rows_indexed': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_scanned': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_skipped': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_total': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'started_at': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'status': ('django.db.models.fields.CharField', [], {'default': "'running'", 'max_length': '20'}),
+            'updated_at': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'})
+        },
+        u'algolia.algoliarebuildcheckpoint': {
+            'Meta': {'object_name': 'AlgoliaRebuildCheckpoint'},
+            'end_pk': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_pk': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'rebuild': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'checkpoints'", 'to': u"orm['algolia.AlgoliaRebuild']"}),
+            'rows_indexed': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_scanned': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_total': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'start_pk': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True'}),
+            'status': ('django.db.models.fields.CharField', [], {'default': "'pending'", 'max_length': '20'})
+        },
+        u'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        }
+    }
+
+    complete_apps = ['algolia']
+    symmetrical = True
\ No newline at end of file
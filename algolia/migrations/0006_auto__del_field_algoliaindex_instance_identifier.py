@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Deleting field 'AlgoliaIndex.instance_identifier'
+        db.delete_column(u'algolia_algoliaindex', 'instance_identifier')
+
+        # Deleting field 'AlgoliaIndex.index'
+        db.delete_column(u'algolia_algoliaindex', 'index')
+
+        # Renaming field 'AlgoliaIndex.index_name' to 'AlgoliaIndex.index'
+        db.rename_column(u'algolia_algoliaindex', 'index_name_id', 'index_id')
+
+        # Changing field 'AlgoliaIndex.index'
+        db.alter_column(u'algolia_algoliaindex', 'index_id', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['algolia.AlgoliaIndexName']))
+
+        # Changing field 'AlgoliaIndex.content_type'
+        db.alter_column(u'algolia_algoliaindex', 'content_type_id', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['contenttypes.ContentType']))
+
+        # Adding unique constraint on 'AlgoliaIndex', fields ['index', 'content_type', 'object_id']
+        db.create_unique(u'algolia_algoliaindex', ['index_id', 'content_type_id', 'object_id'])
+
+        # Adding unique constraint on 'AlgoliaIndex', fields ['index', 'content_type', 'object_key']
+        db.create_unique(u'algolia_algoliaindex', ['index_id', 'content_type_id', 'object_key'])
+
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'AlgoliaIndex', fields ['index', 'content_type', 'object_key']
+        db.delete_unique(u'algolia_algoliaindex', ['index_id', 'content_type_id', 'object_key'])
+
+        # Removing unique constraint on 'AlgoliaIndex', fields ['index', 'content_type', 'object_id']
+        db.delete_unique(u'algolia_algoliaindex', ['index_id', 'content_type_id', 'object_id'])
+
+        # Changing field 'AlgoliaIndex.content_type'
+        db.alter_column(u'algolia_algoliaindex', 'content_type_id', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['contenttypes.ContentType'], null=True))
+
+        # Changing field 'AlgoliaIndex.index'
+        db.alter_column(u'algolia_algoliaindex', 'index_id', self.gf('django.db.models.fields.related.ForeignKey')(null=True, to=orm['algolia.AlgoliaIndexName']))
+
+        # Renaming field 'AlgoliaIndex.index' to 'AlgoliaIndex.index_name'
+        db.rename_column(u'algolia_algoliaindex', 'index_id', 'index_name_id')
+
+        # Adding field 'AlgoliaIndex.index'
+        db.add_column(u'algolia_algoliaindex', 'index',
+                      self.gf('django.db.models.fields.CharField')(default='', max_length=255),
+                      keep_default=False)
+
+        # Adding field 'AlgoliaIndex.instance_identifier'
+        db.add_column(u'algolia_algoliaindex', 'instance_identifier',
+                      self.gf('django.db.models.fields.CharField')(default='', max_length=1000),
+                      keep_default=False)
+
+
+    models = {
+        u'algolia.algoliaindex': {
+            'Meta': {'unique_together': "(('index', 'content_type', 'object_id'), ('index', 'content_type', 'object_key'))", 'object_name': 'AlgoliaIndex'},
+            'chunks': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'index': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'algolia_indexes'", 'to': u"orm['algolia.AlgoliaIndexName']"}),
+            'object_id': ('django.db.models.fields.BigIntegerField', [], {'null': 'True'}),
+            'object_key': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True'})
+        },
+        u'algolia.algoliaindexname': {
+            'Meta': {'object_name': 'AlgoliaIndexName'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '255'})
+        },
+        u'algolia.algoliarebuild': {
+            'Meta': {'object_name': 'AlgoliaRebuild'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'index': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'rows_indexed': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_scanned': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_skipped': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_total': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'started_at': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'status': ('django.db.models.fields.CharField', [], {'default': "'running'", 'max_length': '20'}),
+            'updated_at': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'})
+        },
+        u'algolia.algoliarebuildcheckpoint': {
+            'Meta': {'object_name': 'AlgoliaRebuildCheckpoint'},
+            'end_pk': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_pk': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'rebuild': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'checkpoints'", 'to': u"orm['algolia.AlgoliaRebuild']"}),
+            'rows_indexed': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_scanned': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'rows_total': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'start_pk': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True'}),
+            'status': ('django.db.models.fields.CharField', [], {'default': "'pending'", 'max_length': '20'})
+        },
+        u'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        }
+    }
+
+    complete_apps = ['algolia']
\ No newline at end of file
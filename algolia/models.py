@@ -1,7 +1,24 @@
 # -*- coding: utf-8 -*-
+import datetime
+from operator import or_
+
 from django.db import models
+from django.db.models import F, Q, get_model
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+
+from .transaction import on_commit
+
+__all__ = ['AlgoliaIndexName', 'AlgoliaIndex', 'AlgoliaRebuild', 'AlgoliaRebuildCheckpoint']
 
-__all__ = ['AlgoliaIndex']
+INTEGER_FIELDS = (
+    'AutoField',
+    'IntegerField',
+    'BigIntegerField',
+    'SmallIntegerField',
+    'PositiveIntegerField',
+    'PositiveSmallIntegerField',
+)
 
 
 def get_model_identifier(model):
@@ -50,25 +67,207 @@ def get_instance_identifier(instance):
     return '{0}.{1}'.format(model_identifier, instance.pk)
 
 
+def has_integer_pk(model):
+    """Check if the primary key of a model is an integer
+
+    Tests:
+        >>> has_integer_pk(AlgoliaIndex)
+        True
+
+        >>> from django.contrib.sessions.models import Session
+        >>> has_integer_pk(Session)
+        False
+    """
+    field = model._meta.pk
+
+    # Follows the parent links of multi-table inheritance
+    while field.rel:
+        field = field.rel.get_related_field()
+
+    return field.get_internal_type() in INTEGER_FIELDS
+
+
+def get_instance_key(instance):
+    """
+    Returns a (content type id, primary key) tuple which identifies an instance,
+    like the `AlgoliaIndex.get_key` of its AlgoliaIndex object
+    """
+    content_type = ContentType.objects.get_for_model(instance.__class__)
+    if has_integer_pk(instance.__class__):
+        return content_type.id, instance.pk
+    return content_type.id, unicode(instance.pk)
+
+
+class AlgoliaIndexName(models.Model):
+    """Name of an Algolia index, referenced by the AlgoliaIndex objects"""
+
+    # Cache of the committed ids by name, the names are never deleted
+    ids = {}
+
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+    )
+
+    def __unicode__(self):
+        return self.name
+
+    @classmethod
+    def get_id(cls, name):
+        """Returns the id of an index name, and creates it if necessary"""
+        if name in cls.ids:
+            return cls.ids[name]
+
+        index_name = cls.objects.get_or_create(name=name)[0]
+        # A name created in a transaction which is rolled back must not be cached
+        on_commit(cls.cache_ids, (name, index_name.id))
+        return index_name.id
+
+    @classmethod
+    def cache_ids(cls, items):
+        """Caches a list of committed (name, id) tuples"""
+        cls.ids.update(items)
+
+
+class AlgoliaIndexManager(models.Manager):
+    """Bulk helpers to resolve many instances to their AlgoliaIndex objects"""
+
+    def for_index(self, index):
+        """Returns the AlgoliaIndex objects of an index"""
+        return self.filter(index=AlgoliaIndexName.get_id(index))
+
+    def for_pks(self, index, model, pks):
+        """Returns the AlgoliaIndex objects of the instances of a model with one query"""
+        queryset = self.for_index(index).filter(
+            content_type=ContentType.objects.get_for_model(model),
+        )
+
+        if has_integer_pk(model):
+            return queryset.filter(object_id__in=pks)
+        return queryset.filter(object_key__in=[unicode(pk) for pk in pks])
+
+    def for_instances(self, index, instances):
+        """
+        Returns the AlgoliaIndex objects of several instances, of any models, with one query.
+        If `index` is None, the objects of all the indexes are returned.
+        """
+        pks_by_model = {}
+        for instance in instances:
+            pks_by_model.setdefault(instance.__class__, []).append(instance.pk)
+
+        if not pks_by_model:
+            return self.none()
+
+        queries = []
+        for model, pks in pks_by_model.items():
+            content_type = ContentType.objects.get_for_model(model)
+            if has_integer_pk(model):
+                queries.append(Q(content_type=content_type, object_id__in=pks))
+            else:
+                queries.append(Q(
+                    content_type=content_type,
+                    object_key__in=[unicode(pk) for pk in pks],
+                ))
+
+        queryset = self.all() if index is None else self.for_index(index)
+        return queryset.filter(reduce(or_, queries))
+
+    def get_object_ids(self, index, model, pks):
+        """
+        Resolves the primary keys of instances of a model to their objectIDs with one query,
+        and returns them as a dict. The keys are the stored primary keys, like `get_instance_key`,
+        and the primary keys which are not indexed are missing.
+
+        Use:
+            object_ids = AlgoliaIndex.objects.get_object_ids('MyPonyDjangoAlgolia', MyPony, pks)
+            index.delete_objects(object_ids.values())
+        """
+        pk_field = 'object_id' if has_integer_pk(model) else 'object_key'
+        return dict(self.for_pks(index, model, pks).values_list(pk_field, 'id'))
+
+
 class AlgoliaIndex(models.Model):
     """
     A model which stores in databases all elements
     indexed on Algolia website
     """
 
-    unique_together = ('index', 'instance_identifier')
+    index = models.ForeignKey(
+        AlgoliaIndexName,
+        related_name='algolia_indexes',
+        help_text='Algolia index where the model is indexed',
+    )
 
-    index = models.CharField(
+    content_type = models.ForeignKey(ContentType)
+
+    object_id = models.BigIntegerField(
+        null=True,
+        help_text='Primary key of the instance, if it is an integer',
+    )
+
+    object_key = models.CharField(
         max_length=255,
-        help_text='Algolia index where the model is indexed',
+        null=True,
+        help_text='Primary key of the instance, if it is not an integer (UUID, ...)',
     )
 
-    instance_identifier = models.CharField(
-        max_length=1000,
-        help_text='Instance identifier like : app.Model.X '
-                  'where X is primary key of instance',
+    chunks = models.TextField(
+        blank=True,
+        default='',
+        help_text='Comma separated fingerprints of the records of a split instance',
     )
 
+    objects = AlgoliaIndexManager()
+
+    class Meta:
+        unique_together = (
+            ('index', 'content_type', 'object_id'),
+            ('index', 'content_type', 'object_key'),
+        )
+
+    @property
+    def object_pk(self):
+        """Returns the primary key of the indexed instance"""
+        if self.object_id is not None:
+            return self.object_id
+        return self.object_key
+
+    def get_key(self):
+        """Returns a (content type id, primary key) tuple, like `get_instance_key`"""
+        return self.content_type_id, self.object_pk
+
+    def get_model(self):
+        """Returns the model of the indexed instance"""
+        return ContentType.objects.get_for_id(self.content_type_id).model_class()
+
+    def get_chunks(self):
+        """Returns the fingerprints of the records stored for a split instance"""
+        if not self.chunks:
+            return []
+        return self.chunks.split(',')
+
+    def set_chunks(self, fingerprints):
+        """Stores the fingerprints of the records of a split instance"""
+        self.chunks = ','.join(fingerprints)
+        self.save()
+
+    @classmethod
+    def build_object(cls, index, instance):
+        """
+        Returns an unsaved AlgoliaIndex object
+        """
+        obj = cls(
+            index_id=AlgoliaIndexName.get_id(index),
+            content_type=ContentType.objects.get_for_model(instance.__class__),
+        )
+
+        if has_integer_pk(instance.__class__):
+            obj.object_id = instance.pk
+        else:
+            obj.object_key = unicode(instance.pk)
+
+        return obj
+
     @classmethod
     def get_object_or_none(cls, index, instance):
         """
@@ -76,10 +275,7 @@ class AlgoliaIndex(models.Model):
         else return None
         """
         try:
-            return cls.objects.get(
-                index=index,
-                instance_identifier=get_instance_identifier(instance),
-            )
+            return cls.objects.for_instances(index, [instance]).get()
         except cls.DoesNotExist:
             return None
 
@@ -88,10 +284,7 @@ class AlgoliaIndex(models.Model):
         """
         Creates and returns AlgoliaIndex object
         """
-        obj = cls(
-            index=index,
-            instance_identifier=get_instance_identifier(instance),
-        )
+        obj = cls.build_object(index, instance)
         obj.save()
         return obj
 
@@ -103,3 +296,212 @@ class AlgoliaIndex(models.Model):
             obj.delete()
         except cls.DoesNotExist:
             pass
+
+
+class AlgoliaRebuild(models.Model):
+    """
+    A rebuild of an Algolia index, split into checkpoints which can be
+    processed by several workers at once, and resumed after a crash
+    """
+
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_CHOICES = (
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+    )
+
+    index = models.CharField(
+        max_length=255,
+        db_index=True,
+        help_text='Algolia index which is rebuilt',
+    )
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_RUNNING,
+    )
+
+    rows_total = models.PositiveIntegerField(default=0)
+
+    rows_scanned = models.PositiveIntegerField(
+        default=0,
+        help_text='Rows read from the database, including the ones which should not be indexed',
+    )
+
+    rows_indexed = models.PositiveIntegerField(
+        default=0,
+        help_text='Rows sent to Algolia API',
+    )
+
+    rows_skipped = models.PositiveIntegerField(
+        default=0,
+        help_text='Rows already scanned when the rebuild has been started or resumed',
+    )
+
+    started_at = models.DateTimeField(
+        default=timezone.now,
+        help_text='Date of the start or of the last resumption of the rebuild',
+    )
+
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __unicode__(self):
+        eta = self.get_eta()
+        return u'{0}: {1}/{2} rows scanned ({3}%), {4} indexed, {5:.0f} rows/s, ETA {6}'.format(
+            self.index,
+            self.rows_scanned,
+            self.rows_total,
+            self.get_percentage(),
+            self.rows_indexed,
+            self.get_throughput(),
+            eta if eta is not None else '-',
+        )
+
+    def get_percentage(self):
+        """Returns the percentage of rows scanned"""
+        if not self.rows_total:
+            return 100
+        return self.rows_scanned * 100 // self.rows_total
+
+    def get_throughput(self):
+        """Returns the number of rows scanned by second since the (re)start of the rebuild"""
+        elapsed = (self.updated_at - self.started_at).total_seconds()
+        if elapsed <= 0:
+            return 0.0
+        return (self.rows_scanned - self.rows_skipped) / elapsed
+
+    def get_eta(self):
+        """Returns the estimated time remaining as a timedelta, or None if it is unknown"""
+        throughput = self.get_throughput()
+        if not throughput:
+            return None
+        seconds = int((self.rows_total - self.rows_scanned) / throughput)
+        return datetime.timedelta(seconds=max(seconds, 0))
+
+    def claim_checkpoint(self):
+        """Returns the next pending checkpoint after marking it as running, or None.
+        Each checkpoint is claimed by only one worker."""
+        pending = self.checkpoints.filter(status=AlgoliaRebuildCheckpoint.STATUS_PENDING)
+
+        for checkpoint in pending.order_by('id'):
+            claimed = AlgoliaRebuildCheckpoint.objects.filter(
+                pk=checkpoint.pk,
+                status=AlgoliaRebuildCheckpoint.STATUS_PENDING,
+            ).update(status=AlgoliaRebuildCheckpoint.STATUS_RUNNING)
+
+            if claimed:
+                checkpoint.status = AlgoliaRebuildCheckpoint.STATUS_RUNNING
+                return checkpoint
+
+        return None
+
+    def finish(self):
+        """Marks the rebuild as done if all its checkpoints are done"""
+        remaining = self.checkpoints.exclude(status=AlgoliaRebuildCheckpoint.STATUS_DONE)
+        if not remaining.exists():
+            self.status = self.STATUS_DONE
+            AlgoliaRebuild.objects.filter(pk=self.pk).update(status=self.STATUS_DONE)
+
+    def resume(self):
+        """Releases the checkpoints of the crashed workers and restarts the throughput measure"""
+        self.checkpoints.filter(
+            status=AlgoliaRebuildCheckpoint.STATUS_RUNNING,
+        ).update(status=AlgoliaRebuildCheckpoint.STATUS_PENDING)
+
+        self.rows_skipped = self.rows_scanned
+        self.started_at = self.updated_at = timezone.now()
+        self.save()
+
+
+class AlgoliaRebuildCheckpoint(models.Model):
+    """
+    A range of primary keys of a model to index during a rebuild,
+    with the last primary key committed to Algolia API
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+    )
+
+    rebuild = models.ForeignKey(AlgoliaRebuild, related_name='checkpoints')
+
+    model = models.CharField(
+        max_length=255,
+        help_text='Model identifier like : app.Model',
+    )
+
+    start_pk = models.CharField(
+        max_length=255,
+        null=True,
+        help_text='Excluded lower bound of the range, none for the first one',
+    )
+
+    end_pk = models.CharField(
+        max_length=255,
+        null=True,
+        help_text='Included upper bound of the range, none for the last one',
+    )
+
+    last_pk = models.CharField(
+        max_length=255,
+        null=True,
+        help_text='Last primary key committed to Algolia API',
+    )
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+    )
+
+    rows_total = models.PositiveIntegerField(default=0)
+
+    rows_scanned = models.PositiveIntegerField(default=0)
+
+    rows_indexed = models.PositiveIntegerField(default=0)
+
+    def get_model(self):
+        """Returns the model class of the checkpoint"""
+        return get_model(*self.model.split('.'))
+
+    def filter_queryset(self, queryset):
+        """Restricts a queryset of the model to the remaining rows of the range"""
+        to_python = self.get_model()._meta.pk.to_python
+        start_pk = self.last_pk if self.last_pk is not None else self.start_pk
+
+        if start_pk is not None:
+            queryset = queryset.filter(pk__gt=to_python(start_pk))
+        if self.end_pk is not None:
+            queryset = queryset.filter(pk__lte=to_python(self.end_pk))
+
+        return queryset
+
+    def commit(self, last_pk, rows_scanned, rows_indexed):
+        """Records that the rows up to `last_pk` are stored on Algolia API,
+        `rows_indexed` of the `rows_scanned` rows having been sent"""
+        self.last_pk = unicode(last_pk)
+        self.rows_scanned += rows_scanned
+        self.rows_indexed += rows_indexed
+
+        AlgoliaRebuildCheckpoint.objects.filter(pk=self.pk).update(
+            last_pk=self.last_pk,
+            rows_scanned=F('rows_scanned') + rows_scanned,
+            rows_indexed=F('rows_indexed') + rows_indexed,
+        )
+        AlgoliaRebuild.objects.filter(pk=self.rebuild_id).update(
+            rows_scanned=F('rows_scanned') + rows_scanned,
+            rows_indexed=F('rows_indexed') + rows_indexed,
+            updated_at=timezone.now(),
+        )
+
+    def finish(self):
+        """Marks the checkpoint as done"""
+        self.status = self.STATUS_DONE
+        AlgoliaRebuildCheckpoint.objects.filter(pk=self.pk).update(status=self.STATUS_DONE)
@@ -0,0 +1,450 @@
+# -*- coding: utf-8 -*-
+import copy
+import json
+import hashlib
+from decimal import Decimal
+
+from .models import INTEGER_FIELDS
+from .utils import get_facets, FACET_NUMERIC, FACET_TAGS
+
+__all__ = ['AlgoliaQuery', 'EmptyQuery']
+
+LOOKUPS = ('exact', 'in', 'gt', 'gte', 'lt', 'lte', 'range')
+
+# Maximum number of compiled filters kept in memory
+COMPILED_FILTERS_SIZE = 1000
+
+# Compiled filters by model and conditions
+compiled_filters = {}
+
+# Marks the conditions which are not compiled yet, None marking an empty query
+MISSING = object()
+
+
+class EmptyQuery(Exception):
+    """Raised when the filters of a query can not match any record"""
+
+
+def is_integer_facet(model, name):
+    """Checks if a numeric facet is an integer model field, whose values can be collapsed
+    into ranges
+
+    Tests:
+        >>> from algolia.models import AlgoliaRebuild
+        >>> is_integer_facet(AlgoliaRebuild, 'rows_total')
+        True
+        >>> is_integer_facet(AlgoliaRebuild, 'index')
+        False
+    """
+    return model._meta.get_field(name).get_internal_type() in INTEGER_FIELDS
+
+
+def normalize_value(model, name, facet_type, value):
+    """Returns a filter value as it is stored in the records: a number for numeric facets,
+    else a string. Only the values of integer fields are integers.
+
+    Tests:
+        >>> from algolia.models import AlgoliaRebuild
+        >>> normalize_value(AlgoliaRebuild, 'rows_total', 'numeric', 3.0)
+        3
+        >>> normalize_value(AlgoliaRebuild, 'rows_total', 'numeric', Decimal('2.5'))
+        2.5
+        >>> normalize_value(object, 'color', 'string', 3)
+        u'3'
+
+        >>> normalize_value(object, 'age', 'numeric', 'three')
+        Traceback (most recent call last):
+        ValueError: object.age is a numeric facet, 'three' is not a number
+    """
+    if facet_type != FACET_NUMERIC:
+        return unicode(value)
+
+    if isinstance(value, bool) or not isinstance(value, (int, long, float, Decimal)):
+        raise ValueError('{0}.{1} is a numeric facet, {2!r} is not a number'.format(
+            model.__name__,
+            name,
+            value,
+        ))
+
+    if value == int(value) and is_integer_facet(model, name):
+        return int(value)
+    return float(value)
+
+
+def collapse_integers(values):
+    """Groups sorted values into (first, last) runs of consecutive integers
+
+    Tests:
+        >>> collapse_integers([1, 2, 3, 5, 7, 8, 9.5])
+        [(1, 3), (5, 5), (7, 8), (9.5, 9.5)]
+    """
+    runs = []
+
+    for value in values:
+        if runs and isinstance(value, (int, long)) and value == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], value)
+        else:
+            runs.append((value, value))
+
+    return runs
+
+
+def tighten_bound(bound, value, inclusive, is_lower):
+    """Returns the most restrictive of a (value, inclusive) bound and a new one
+
+    Tests:
+        >>> tighten_bound(None, 3, True, True)
+        (3, True)
+        >>> tighten_bound((3, True), 3, False, True)
+        (3, False)
+        >>> tighten_bound((5, True), 3, False, True)
+        (5, True)
+        >>> tighten_bound((5, True), 3, True, False)
+        (3, True)
+    """
+    if bound is None:
+        return value, inclusive
+
+    if value == bound[0]:
+        return value, inclusive and bound[1]
+
+    if (value > bound[0]) == is_lower:
+        return value, inclusive
+    return bound
+
+
+def is_in_bounds(value, lower, upper):
+    """Checks if a value is between a lower and an upper (value, inclusive) bounds"""
+    if lower is not None and (value < lower[0] or (value == lower[0] and not lower[1])):
+        return False
+    if upper is not None and (value > upper[0] or (value == upper[0] and not upper[1])):
+        return False
+    return True
+
+
+def compile_numeric_filters(name, allowed, excluded, lower, upper):
+    """Returns the numericFilters of a numeric facet
+
+    The allowed values are encoded as equalities and ranges of consecutive integers,
+    so a long list of ids becomes a few ranges.
+
+    Tests:
+        >>> compile_numeric_filters('age', set([1, 2, 3, 7]), set(), None, None)
+        [['age:1 to 3', 'age=7']]
+        >>> compile_numeric_filters('age', set([1, 2, 3]), set([2]), (2, True), None)
+        ['age=3']
+        >>> compile_numeric_filters('age', None, set([4]), (1, True), (9, True))
+        ['age:1 to 9', 'age!=4']
+        >>> compile_numeric_filters('age', None, set(), (1, False), (9, True))
+        ['age>1', 'age<=9']
+    """
+    if allowed is not None:
+        values = sorted(
+            value for value in allowed
+            if value not in excluded and is_in_bounds(value, lower, upper)
+        )
+        if not values:
+            raise EmptyQuery()
+
+        group = []
+        for first, last in collapse_integers(values):
+            if first == last:
+                group.append('{0}={1}'.format(name, first))
+            else:
+                group.append('{0}:{1} to {2}'.format(name, first, last))
+
+        return group if len(group) == 1 else [group]
+
+    filters = []
+    if lower is not None and upper is not None:
+        if lower[0] > upper[0] or (lower[0] == upper[0] and not (lower[1] and upper[1])):
+            raise EmptyQuery()
+        if lower[1] and upper[1]:
+            filters.append('{0}:{1} to {2}'.format(name, lower[0], upper[0]))
+            lower = upper = None
+
+    if lower is not None:
+        filters.append('{0}{1}{2}'.format(name, '>=' if lower[1] else '>', lower[0]))
+    if upper is not None:
+        filters.append('{0}{1}{2}'.format(name, '<=' if upper[1] else '<', upper[0]))
+
+    filters.extend('{0}!={1}'.format(name, value) for value in sorted(excluded))
+    return filters
+
+
+def compile_facet_filters(name, allowed, excluded):
+    """Returns the facetFilters of a string facet
+
+    Tests:
+        >>> compile_facet_filters('color', set([u'pink', u'blue']), set([u'blue']))
+        [u'color:pink']
+        >>> compile_facet_filters('color', set([u'pink', u'blue']), set())
+        [[u'color:blue', u'color:pink']]
+        >>> compile_facet_filters('color', None, set([u'red', u'old']))
+        [u'color:-old', u'color:-red']
+    """
+    if allowed is not None:
+        values = sorted(allowed - excluded)
+        if not values:
+            raise EmptyQuery()
+
+        group = [u'{0}:{1}'.format(name, value) for value in values]
+        return group if len(group) == 1 else [group]
+
+    return [u'{0}:-{1}'.format(name, value) for value in sorted(excluded)]
+
+
+def compile_tag_filters(groups, excluded):
+    """Returns the tagFilters of the tags. A record has several tags, so each group
+    of allowed tags is required on its own, instead of being intersected.
+
+    Tests:
+        >>> compile_tag_filters(set([frozenset([u'red']), frozenset([u'old'])]), set())
+        [u'old', u'red']
+        >>> compile_tag_filters(set([frozenset([u'red', u'old'])]), set([u'red']))
+        [u'old', u'-red']
+        >>> compile_tag_filters(None, set([u'red', u'old']))
+        [u'-old', u'-red']
+    """
+    filters = []
+
+    for group in sorted(sorted(group) for group in groups or ()):
+        values = [value for value in group if value not in excluded]
+        if not values:
+            raise EmptyQuery()
+        filters.append(values[0] if len(values) == 1 else values)
+
+    filters.extend(u'-{0}'.format(value) for value in sorted(excluded))
+    return filters
+
+
+def compile_filters(model, conditions):
+    """
+    Compiles the conditions of a query into Algolia parameters, merging the
+    conditions on the same facet: the `in` lists are intersected, except for
+    the tags, and only the tightest bounds are kept. The result is memoized by
+    model and conditions.
+
+    Raises EmptyQuery if the conditions can not match any record.
+    """
+    key = (model, conditions)
+    # Read once, the filters may be cleared by another thread in between
+    compiled = compiled_filters.get(key, MISSING)
+    if compiled is None:
+        raise EmptyQuery()
+    if compiled is not MISSING:
+        return compiled
+
+    if len(compiled_filters) >= COMPILED_FILTERS_SIZE:
+        compiled_filters.clear()
+
+    facets = get_facets(model)
+    states = {}
+
+    for name, lookup, value, negated in conditions:
+        allowed, excluded, lower, upper = states.get(name, (None, frozenset(), None, None))
+
+        if negated:
+            excluded = excluded | value
+        elif lookup == 'in' and facets[name] == FACET_TAGS:
+            # Each condition on the tags is a group of alternatives
+            allowed = (allowed or frozenset()) | frozenset([value])
+        elif lookup == 'in':
+            allowed = value if allowed is None else allowed & value
+        elif lookup in ('gt', 'gte'):
+            lower = tighten_bound(lower, value, lookup == 'gte', True)
+        else:
+            upper = tighten_bound(upper, value, lookup == 'lte', False)
+
+        states[name] = allowed, excluded, lower, upper
+
+    compiled = {}
+    try:
+        for name, (allowed, excluded, lower, upper) in sorted(states.items()):
+            facet_type = facets[name]
+            if facet_type == FACET_NUMERIC:
+                parameter = 'numericFilters'
+                filters = compile_numeric_filters(name, allowed, excluded, lower, upper)
+            elif facet_type == FACET_TAGS:
+                parameter = 'tagFilters'
+                filters = compile_tag_filters(allowed, excluded)
+            else:
+                parameter = 'facetFilters'
+                filters = compile_facet_filters(name, allowed, excluded)
+
+            compiled.setdefault(parameter, []).extend(filters)
+    except EmptyQuery:
+        compiled_filters[key] = None
+        raise
+
+    compiled_filters[key] = compiled
+    return compiled
+
+
+class AlgoliaQuery(object):
+    """
+    Builds the parameters of a search on the index of a model, from filters on
+    the attributes declared in its ALGOLIA_FACETS and ALGOLIA_TAGS_FIELD.
+
+    Each facet is filtered with the cheapest encoding for its type: numericFilters
+    for the numeric model fields, tagFilters for the tags and facetFilters for
+    the others. Like a queryset, a query is never modified: each method returns
+    a new one.
+
+    Use:
+        query = AlgoliaQuery(Pony).search('rainbow').filter(color__in=['pink', 'blue'])
+        query = query.filter(age__gte=3).exclude(tags='retired').extra(hitsPerPage=50)
+        response = query.execute()
+
+        # The key only depends on the index, the text and the parameters
+        response = cache.get(query.get_cache_key())
+    """
+
+    def __init__(self, model, indexer=None):
+        self.model = model
+        self.indexer = indexer
+        self.facets = get_facets(model)
+        self.text = u''
+        self.conditions = frozenset()
+        self.params = {}
+        self.shard = None
+
+    def _clone(self):
+        query = self.__class__(self.model, indexer=self.indexer)
+        query.text = self.text
+        query.conditions = self.conditions
+        query.params = dict(self.params)
+        query.shard = self.shard
+        return query
+
+    def _get_conditions(self, lookups, negated):
+        conditions = set()
+
+        for lookup, value in lookups.items():
+            name, _, operator = lookup.partition('__')
+            operator = operator or 'exact'
+
+            if name not in self.facets:
+                raise ValueError('{0}.{1} is not a facet, add it to ALGOLIA_FACETS'.format(
+                    self.model.__name__,
+                    name,
+                ))
+            if operator not in LOOKUPS:
+                raise ValueError('Unsupported lookup "{0}"'.format(lookup))
+
+            facet_type = self.facets[name]
+            if operator not in ('exact', 'in') and (negated or facet_type != FACET_NUMERIC):
+                raise ValueError('The "{0}" lookup only filters numeric facets, '
+                                 'and can not be excluded'.format(lookup))
+
+            if operator == 'exact':
+                operator, value = 'in', [value]
+            elif operator == 'range':
+                lower = normalize_value(self.model, name, facet_type, value[0])
+                conditions.add((name, 'gte', lower, negated))
+                operator, value = 'lte', value[1]
+
+            if operator == 'in':
+                value = frozenset(
+                    normalize_value(self.model, name, facet_type, item) for item in value
+                )
+            else:
+                value = normalize_value(self.model, name, facet_type, value)
+
+            conditions.add((name, operator, value, negated))
+
+        return frozenset(conditions)
+
+    def search(self, text):
+        """Returns a query on a full text"""
+        query = self._clone()
+        query.text = text
+        return query
+
+    def filter(self, **lookups):
+        """
+        Returns a query restricted by lookups on the facets, like a queryset:
+        exact, in, and gt, gte, lt, lte, range on the numeric facets
+        """
+        query = self._clone()
+        query.conditions = self.conditions | self._get_conditions(lookups, False)
+        return query
+
+    def exclude(self, **lookups):
+        """Returns a query which excludes values of facets, with exact or in lookups"""
+        query = self._clone()
+        query.conditions = self.conditions | self._get_conditions(lookups, True)
+        return query
+
+    def for_shard(self, shard):
+        """Returns a query sent only to the index of a shard of a model with ALGOLIA_SHARD_FIELD"""
+        query = self._clone()
+        query.shard = unicode(shard)
+        return query
+
+    def extra(self, **params):
+        """Returns a query with other search parameters, like page or attributesToRetrieve"""
+        query = self._clone()
+        query.params.update(params)
+        return query
+
+    def is_empty(self):
+        """Checks if the filters can not match any record, so the API does not have to be called"""
+        try:
+            compile_filters(self.model, self.conditions)
+        except EmptyQuery:
+            return True
+        return False
+
+    def get_params(self):
+        """
+        Returns the parameters of the search, as expected by `AlgoliaIndexer.search`.
+        Raises EmptyQuery if the filters can not match any record.
+        """
+        params = dict(self.params)
+        # The compiled filters are shared by all the queries with the same conditions
+        params.update(copy.deepcopy(compile_filters(self.model, self.conditions)))
+        return params
+
+    def get_indexer(self):
+        if self.indexer is None:
+            from .backends import AlgoliaIndexer
+            self.indexer = AlgoliaIndexer()
+        return self.indexer
+
+    def get_cache_key(self, prefix='algolia'):
+        """Returns a key which identifies the results of the query, stable across processes"""
+        index_name = self.get_indexer()._get_index_name(model=self.model, shard=self.shard)
+
+        try:
+            content = [self.text, self.get_params()]
+        except EmptyQuery:
+            # Never shared with the same query without its contradictory filters
+            content = [self.text, self.params, 'empty']
+
+        content = json.dumps(content, sort_keys=True)
+
+        return '{0}:{1}:{2}'.format(
+            prefix,
+            index_name,
+            hashlib.md5(content.encode('utf-8')).hexdigest(),
+        )
+
+    def execute(self):
+        """Makes the query to Algolia API and return the response as a dict"""
+        if self.is_empty():
+            return {
+                u'hits': [],
+                u'nbHits': 0,
+                u'nbPages': 0,
+                u'page': 0,
+                u'hitsPerPage': self.params.get('hitsPerPage', 20),
+                u'query': self.text,
+            }
+
+        return self.get_indexer().search(
+            self.model,
+            self.text,
+            self.get_params(),
+            shard=self.shard,
+        )
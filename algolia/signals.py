@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
+import copy
 import warnings
+from collections import OrderedDict
 
 from django.db import models
 
-from .utils import is_algolia_managed
+from .utils import is_algolia_managed, filter_should_index
 from .backends import AlgoliaIndexer
+from .transaction import on_commit
 
 __all__ = ['RealtimeSignalProcessor']
 
@@ -60,13 +63,18 @@ class RealtimeSignalProcessor(BaseSignalProcessor):
     At the instance creation and deletion, this signal processor will update the Algolia Index
     and store the information on a AlgoliaIndex object.
 
+    Inside an atomic block, the operations are buffered and sent in one batch
+    after the commit, so rolled back data is never indexed.
+
     Use:
         class MyPony(models.Model):
             ALGOLIA_INDEX = 'MyPonyIndex'
             ALGOLIA_INDEX_FIELDS = ('name', 'clogs_number',)
+            ALGOLIA_SHOULD_INDEX = {'is_published': True}
 
             name = models.CharField(max_length=255)
             clogs_number = models.IntegerField()
+            is_published = models.BooleanField(default=False)
     """
 
     def setup(self):
@@ -81,10 +89,71 @@ class RealtimeSignalProcessor(BaseSignalProcessor):
 
     def handle_save(self, sender, instance, created=False, *args, **kwargs):
         """If this model is managed by the library save it to the algolia index"""
+        using = kwargs.get('using')
+
         if is_algolia_managed(instance):
-            self.indexer.save(instance, created=created)
+            on_commit(self.process, ('save', instance, created), using=using)
+
+        if not created and self.indexer.get_dependent_models(instance.__class__):
+            on_commit(self.process, ('dependents', instance, created), using=using)
 
     def handle_delete(self, sender, instance, *args, **kwargs):
         """If this model is managed by the library, delete it from the algolia index"""
         if is_algolia_managed(instance):
-            self.indexer.delete(instance)
+            # The primary key of the instance is reset by the deletion
+            instance = copy.copy(instance)
+            on_commit(self.process, ('delete', instance, False), using=kwargs.get('using'))
+
+    def process(self, operations):
+        """
+        Sends a list of (action, instance, created) operations to the algolia index,
+        with one batch for the saved instances and one for the deleted ones.
+
+        Only the last operation on an instance is kept. An instance which should not
+        be indexed anymore (see ALGOLIA_SHOULD_INDEX) is deleted from the algolia index,
+        and the indexed instances which depend on an updated instance
+        (see ALGOLIA_DEPENDENCIES) are updated.
+        """
+        last_operations = OrderedDict()
+        dependencies = OrderedDict()
+
+        for action, instance, created in operations:
+            # The instance has been deleted later in the transaction
+            if instance.pk is None:
+                continue
+
+            key = (instance.__class__, instance.pk)
+
+            if action == 'dependents':
+                dependencies[key] = instance
+                continue
+
+            previous_operation = last_operations.pop(key, None)
+            if action == 'save' and previous_operation and previous_operation[0] == 'save':
+                created = created or previous_operation[2]
+
+            last_operations[key] = (action, instance, created)
+
+        instances_to_save = []
+        instances_to_delete = []
+
+        # The filters of ALGOLIA_SHOULD_INDEX are evaluated with one query by model
+        indexable_instances = filter_should_index([
+            operation[1] for operation in last_operations.values() if operation[0] == 'save'
+        ])
+        indexable_keys = set((instance.__class__, instance.pk) for instance in indexable_instances)
+
+        for action, instance, created in last_operations.values():
+            if action == 'save' and (instance.__class__, instance.pk) in indexable_keys:
+                instances_to_save.append((instance, created))
+            elif action == 'delete' or not created:
+                instances_to_delete.append(instance)
+
+        if instances_to_delete:
+            self.indexer.bulk_delete(instances_to_delete)
+
+        if instances_to_save:
+            self.indexer.bulk_save(instances_to_save)
+
+        for instance in dependencies.values():
+            self.indexer.update_dependents(instance)
@@ -2,8 +2,11 @@
 import pytest
 
 from django.core.exceptions import ImproperlyConfigured
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
 
-from algolia import AlgoliaIndexer
+from algolia import AlgoliaIndexer, backends
+from algolia.models import AlgoliaIndex
 
 
 @pytest.fixture()
@@ -76,9 +79,304 @@ def test_get_index_name(indexer):
     assert indexer._get_index_name(model=MyModel, with_suffix=False) == 'MyModel'
 
 
+def test_get_index_name_sharded(indexer):
+    class Tenant(object):
+        slug = 'acme'
+
+    class MyModel(object):
+        ALGOLIA_SHARD_FIELD = 'tenant__slug'
+        tenant = Tenant()
+
+    # The shard is read from the instance, or specified with the model
+    assert indexer._get_index_name(MyModel()) == 'MyModelDjangoAlgolia__acme'
+    assert indexer._get_index_name(model=MyModel, shard='fr') == 'MyModelDjangoAlgolia__fr'
+    assert indexer.get_index_shard('MyModelDjangoAlgolia__fr', MyModel) == 'fr'
+    assert indexer.get_index_shard('MyModelDjangoAlgolia', MyModel) is None
+
+    # The index of another model whose name starts with the same prefix is not a shard
+    assert indexer.get_index_shard('MyModelDjangoAlgolia_fr', MyModel) is None
+    assert indexer.get_index_shard('MyModelDjangoAlgoliaFr__x', MyModel) is None
+
+    # The separator of the shards can not be part of the index names
+    MyModel.ALGOLIA_INDEX = 'My__Model'
+    with pytest.raises(ValueError):
+        indexer._get_index_name(model=MyModel, shard='fr')
+    del MyModel.ALGOLIA_INDEX
+
+    with pytest.raises(ValueError):
+        indexer._get_index_name(model=MyModel)
+
+    MyModel.tenant = None
+    with pytest.raises(ValueError):
+        indexer._get_index_name(MyModel())
+
+    class NotShardedModel(object):
+        pass
+
+    with pytest.raises(ValueError):
+        indexer._get_index_name(model=NotShardedModel, shard='fr')
+
+    # The separator can be used by the models which are not sharded
+    NotShardedModel.ALGOLIA_INDEX = 'prod__ponies'
+    assert indexer._get_index_name(model=NotShardedModel) == 'prod__poniesDjangoAlgolia'
+    indexer.configs['INDEX_SUFFIX'] = '__test'
+    assert indexer._get_index_name(model=NotShardedModel) == 'prod__ponies__test'
+
+
 def test_search(indexer):
     class MyModel():
         pass
 
     indexer.configs['TEST_MODE'] = True
     assert indexer.search(MyModel, 'test') == indexer.test_response
+
+
+class FakeIndex(object):
+    """Records the calls made to the Algolia index"""
+
+    index_name = 'FakeIndex'
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def method(*args):
+            self.calls.append((name,) + args)
+            return {}
+        return method
+
+
+class FakeAlgoliaIndex(object):
+
+    def __init__(self, id, chunks=None):
+        self.id = id
+        self.chunks = chunks or []
+        self.deleted = False
+
+    def get_chunks(self):
+        return self.chunks
+
+    def set_chunks(self, fingerprints):
+        self.chunks = fingerprints
+
+    def delete(self):
+        self.deleted = True
+
+
+@pytest.fixture()
+def split_class():
+    class Article(object):
+        ALGOLIA_INDEX_FIELDS = ('title', 'body')
+        ALGOLIA_SPLIT_FIELD = 'body'
+        ALGOLIA_SPLIT_SIZE = 10
+
+        title = u'Ponies'
+        body = u'Rainbow Dash and Fluttershy'
+
+        def __unicode__(self):
+            return self.title
+    return Article
+
+
+def test_save_split_instance(indexer, split_class):
+    fake_index = FakeIndex()
+    algolia_index = FakeAlgoliaIndex(42)
+    indexer.get_or_create_algolia_index = lambda instance: (fake_index, algolia_index)
+    instance = split_class()
+
+    indexer.save(instance, created=True)
+
+    # The distinct attribute is set by the first save
+    assert fake_index.calls[0] == ('set_settings', {'attributeForDistinct': '__distinct__'})
+    assert len(fake_index.calls) == 2
+    method, records = fake_index.calls[1]
+    assert method == 'save_objects'
+    assert [record['objectID'] for record in records] == ['42-0', '42-1', '42-2']
+    assert [record['body'] for record in records] == [u'Rainbow', u'Dash and', u'Fluttershy']
+    assert all(record['__distinct__'] == 42 for record in records)
+    assert all(record['title'] == u'Ponies' for record in records)
+    assert len(algolia_index.chunks) == 3
+
+    # Nothing changed, nothing is sent
+    fake_index.calls = []
+    indexer.save(instance)
+    assert fake_index.calls == []
+
+    # Only the changed chunks are rewritten, the remaining ones are deleted
+    instance.body = u'Rainbow Applejack'
+    indexer.save(instance)
+
+    assert fake_index.calls[0] == ('delete_objects', ['42-2'])
+    method, records = fake_index.calls[1]
+    assert method == 'save_objects'
+    assert [record['objectID'] for record in records] == ['42-1']
+    assert len(algolia_index.chunks) == 2
+
+
+def test_update_attributes_split_instance(indexer, split_class, monkeypatch):
+    fake_index = FakeIndex()
+    algolia_index = FakeAlgoliaIndex(42)
+    indexer.get_or_create_algolia_index = lambda instance: (fake_index, algolia_index)
+    instance = split_class()
+    indexer.save(instance, created=True)
+    monkeypatch.setattr(indexer, 'configure_index', lambda index, model: None)
+
+    instance_key = ('article', 42)
+    monkeypatch.setattr(backends, 'get_instance_key', lambda instance: instance_key)
+    algolia_index.get_key = lambda: instance_key
+    monkeypatch.setattr(
+        AlgoliaIndex.objects,
+        'for_instances',
+        lambda index, instances: [algolia_index],
+    )
+
+    # The body drifted without changing the number of chunks, and the title changed:
+    # the chunks are all sent with their whole content
+    instance.title = u'Horses'
+    instance.body = u'Rainbow Dash and Applejack'
+    fake_index.calls = []
+    indexer._update_attributes(fake_index, [instance], ['title'], 'body')
+
+    method, records = fake_index.calls[0]
+    assert method == 'save_objects'
+    assert [record['body'] for record in records] == [u'Rainbow', u'Dash and', u'Applejack']
+    assert all(record['title'] == u'Horses' for record in records)
+
+    # The stored fingerprints match the sent chunks
+    fake_index.calls = []
+    indexer.save(instance)
+    assert fake_index.calls == []
+
+
+def test_update_attributes_non_integer_pk(indexer, monkeypatch):
+    monkeypatch.setattr(ContentType.objects, 'get_for_model', lambda model: ContentType(id=2))
+    monkeypatch.setattr(Session, 'ALGOLIA_INDEX_FIELDS', ('session_data',), raising=False)
+    algolia_index = AlgoliaIndex(id=5, content_type_id=2, object_key=u'42')
+    monkeypatch.setattr(
+        AlgoliaIndex.objects,
+        'for_instances',
+        lambda index, instances: [algolia_index],
+    )
+    fake_index = FakeIndex()
+
+    # The primary key is not a string yet, like the stored key
+    indexer._update_attributes(fake_index, [Session(pk=42, session_data='pony')],
+                               ['session_data'], None)
+    assert fake_index.calls == [
+        ('partial_update_objects', [{'session_data': u'pony', 'objectID': 5}]),
+    ]
+
+
+def test_delete_split_instance(indexer, split_class):
+    fake_index = FakeIndex()
+    algolia_index = FakeAlgoliaIndex(42, ['a', 'b', 'c'])
+    indexer.get_algolia_index = lambda instance: (fake_index, algolia_index)
+
+    indexer.delete(split_class())
+
+    assert algolia_index.deleted
+    assert fake_index.calls == [('delete_objects', ['42-0', '42-1', '42-2'])]
+
+
+def test_search_split_model(indexer, split_class):
+    searches = []
+
+    class SearchIndex(FakeIndex):
+        def search(self, query, args=None):
+            searches.append(args)
+            return {'hits': [
+                {'objectID': '1-0', '__distinct__': 1},
+                {'objectID': '1-2', '__distinct__': 1},
+                {'objectID': '2-0', '__distinct__': 2},
+            ]}
+
+    indexer.get_index = lambda **kwargs: SearchIndex()
+    response = indexer.search(split_class, 'pony')
+
+    assert [hit['objectID'] for hit in response['hits']] == ['1-0', '2-0']
+
+    # Algolia counts and pages the instances, not their chunks
+    indexer.search(split_class, 'pony', {'page': 2})
+    indexer.search(split_class, 'pony', args={'distinct': 0})
+    assert searches == [{'distinct': 1}, {'page': 2, 'distinct': 1}, {'distinct': 0}]
+
+
+def test_configure_index(indexer, split_class):
+    fake_index = FakeIndex()
+
+    # The settings are sent once by process, unless they are forced
+    indexer.configure_index(fake_index, split_class)
+    indexer.configure_index(fake_index, split_class)
+    indexer.configure_index(fake_index, split_class, force=True)
+    assert fake_index.calls == [
+        ('set_settings', {'attributeForDistinct': '__distinct__'}),
+        ('set_settings', {'attributeForDistinct': '__distinct__'}),
+    ]
+
+    # A model without settings sends nothing
+    fake_index.calls = []
+    indexer.configure_index(fake_index, object)
+    assert fake_index.calls == []
+
+
+def test_get_changed_records(indexer):
+    records = [
+        {'objectID': 1, 'name': u'Rainbow Dash'},
+        {'objectID': 2, 'name': u'Fluttershy'},
+        {'objectID': 3, 'name': u'Applejack'},
+    ]
+    remote_records = {
+        u'1': {'objectID': u'1', 'name': u'Rainbow Dash', '_tags': []},
+        u'2': {'objectID': u'2', 'name': u'Pinkie Pie'},
+    }
+
+    changed_records = indexer.get_changed_records(records, remote_records)
+    assert [record['objectID'] for record in changed_records] == [2, 3]
+
+
+def test_run_rebuild_progress(indexer, monkeypatch):
+    class FakeCheckpoint(object):
+        def get_model(self):
+            return object
+
+        def filter_queryset(self, queryset):
+            return queryset
+
+        def commit(self, last_pk, rows_scanned, rows_indexed):
+            commits.append((last_pk, rows_scanned, rows_indexed))
+
+        def finish(self):
+            pass
+
+    class FakeRebuild(object):
+        index = 'FakeIndex'
+        checkpoints = [FakeCheckpoint()]
+
+        def claim_checkpoint(self):
+            return self.checkpoints.pop() if self.checkpoints else None
+
+        def finish(self):
+            pass
+
+    class Instance(object):
+        def __init__(self, pk):
+            self.pk = pk
+
+    commits = []
+    progress = []
+    chunks = [[Instance(1), Instance(2)], [Instance(3)]]
+    monkeypatch.setattr(backends, 'iterate_chunks', lambda queryset, chunk_size: chunks)
+    indexer.get_index_queryset = lambda index_name, model: None
+    indexer.bulk_save = lambda instances: None
+    rebuild = FakeRebuild()
+
+    # The progress is reported after the committed chunks
+    indexer.run_rebuild(rebuild, progress=progress.append, progress_interval=0)
+    assert commits == [(2, 2, 2), (3, 1, 1)]
+    assert progress == [rebuild, rebuild]
+
+    # At most once by interval
+    rebuild.checkpoints = [FakeCheckpoint()]
+    progress = []
+    indexer.run_rebuild(rebuild, progress=progress.append, progress_interval=60)
+    assert progress == []
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from algoliasearch import algoliasearch
+
+from algolia.loadtest import StubAlgoliaServer, StubPoolManager, format_report
+
+
+@pytest.yield_fixture()
+def server():
+    server = StubAlgoliaServer()
+    server.start()
+    pool_manager = algoliasearch.POOL_MANAGER
+    algoliasearch.POOL_MANAGER = StubPoolManager(*server.server_address)
+
+    yield server
+
+    algoliasearch.POOL_MANAGER = pool_manager
+    server.stop()
+
+
+@pytest.fixture()
+def index(server):
+    return algoliasearch.Client('app', 'key').init_index('Ponies')
+
+
+def test_stub_objects(server, index):
+    index.save_objects([
+        {'objectID': '1', 'name': 'Rainbow Dash'},
+        {'objectID': '2', 'name': 'Twilight Sparkle'},
+    ])
+    index.partial_update_object({'objectID': '1', 'color': 'blue'})
+    index.delete_objects(['2'])
+
+    assert server.api.indexes['Ponies'] == {
+        '1': {'objectID': '1', 'name': 'Rainbow Dash', 'color': 'blue'},
+    }
+    assert index.get_objects(['1', '2'])['results'] == [
+        {'objectID': '1', 'name': 'Rainbow Dash', 'color': 'blue'},
+        None,
+    ]
+    assert server.api.calls == {'batch': 2, 'partial_update_object': 1, 'get_objects': 1}
+
+
+def test_stub_search(index):
+    index.save_objects([
+        {'objectID': str(pk), 'name': u'Pony {}'.format(pk)} for pk in range(30)
+    ])
+
+    response = index.search('pony', {'hitsPerPage': 10, 'page': 2})
+    assert response['nbHits'] == 30
+    assert [hit['objectID'] for hit in response['hits']] == [str(pk) for pk in range(20, 30)]
+    assert index.search('pony 12')['nbHits'] == 1
+    assert index.browse(0, 25)['nbPages'] == 2
+
+
+def test_stub_rate_limit(server, index):
+    server.rate_limit = 1
+
+    with pytest.raises(algoliasearch.AlgoliaException) as error:
+        index.search('pony')
+    assert 'Too many requests' in str(error.value)
+
+
+def test_report():
+    samples = {
+        'create': [(0.010, 3, None), (0.020, 3, None), (0.030, 6, 'rate limited')],
+        'search': [(0.005, 0, None)],
+    }
+    lines = format_report(samples, 2, {'batch': 3, 'search': 1})
+
+    assert lines[0].split() == [
+        'operation', 'count', 'ops/s', 'p50', 'ms', 'p95', 'ms', 'p99', 'ms', 'max', 'ms',
+        'queries/op', 'errors',
+    ]
+    assert lines[1].split() == [
+        'create', '3', '1.5', '20.0', '30.0', '30.0', '30.0', '4.0', '1',
+    ]
+    assert lines[2].split()[:2] == ['search', '1']
+    assert lines[3:] == ['create errors: 1 rate limited', 'API calls: 3 batch, 1 search']
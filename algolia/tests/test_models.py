@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+import pytest
+
+from django.db import transaction
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+
+from algolia.models import AlgoliaIndex, AlgoliaIndexName, AlgoliaRebuild, get_instance_key
+from algolia.tests.test_transaction import FakeConnection
+
+
+@pytest.fixture()
+def rebuild():
+    started_at = datetime.datetime(2015, 6, 1, 12, 0, 0)
+    return AlgoliaRebuild(
+        index='MyPonyDjangoAlgolia',
+        rows_total=10000,
+        rows_scanned=3000,
+        rows_indexed=2500,
+        rows_skipped=1000,
+        started_at=started_at,
+        updated_at=started_at + datetime.timedelta(seconds=10),
+    )
+
+
+def test_rebuild_progress(rebuild):
+    assert rebuild.get_percentage() == 30
+    # Rows scanned before the last resumption are not counted in the throughput
+    assert rebuild.get_throughput() == 200
+    assert rebuild.get_eta() == datetime.timedelta(seconds=35)
+    assert unicode(rebuild) == (u'MyPonyDjangoAlgolia: 3000/10000 rows scanned (30%), '
+                                u'2500 indexed, 200 rows/s, ETA 0:00:35')
+
+
+def test_rebuild_progress_at_start(rebuild):
+    rebuild.updated_at = rebuild.started_at
+    assert rebuild.get_throughput() == 0
+    assert rebuild.get_eta() is None
+
+    rebuild.rows_total = 0
+    assert rebuild.get_percentage() == 100
+
+
+@pytest.fixture()
+def content_types(monkeypatch):
+    content_types = {AlgoliaIndex: ContentType(id=1), Session: ContentType(id=2)}
+    monkeypatch.setattr(ContentType.objects, 'get_for_model', lambda model: content_types[model])
+    monkeypatch.setattr(AlgoliaIndexName, 'ids', {'MyPonyDjangoAlgolia': 3})
+    return content_types
+
+
+def test_build_object_integer_pk(content_types):
+    instance = AlgoliaIndex(id=42)
+    algolia_index = AlgoliaIndex.build_object('MyPonyDjangoAlgolia', instance)
+
+    assert algolia_index.index_id == 3
+    assert algolia_index.object_id == 42
+    assert algolia_index.object_key is None
+    assert algolia_index.get_key() == get_instance_key(instance) == (1, 42)
+
+
+def test_build_object_string_pk(content_types):
+    instance = Session(session_key='rainbow')
+    algolia_index = AlgoliaIndex.build_object('MyPonyDjangoAlgolia', instance)
+
+    assert algolia_index.object_id is None
+    assert algolia_index.object_key == 'rainbow'
+    assert algolia_index.get_key() == get_instance_key(instance) == (2, 'rainbow')
+
+
+def test_index_name_cached_after_commit(monkeypatch):
+    connection = FakeConnection()
+    monkeypatch.setattr(transaction, 'get_connection', lambda using=None: connection)
+    monkeypatch.setattr(AlgoliaIndexName, 'ids', {})
+    monkeypatch.setattr(
+        AlgoliaIndexName.objects,
+        'get_or_create',
+        lambda name: (AlgoliaIndexName(id=7, name=name), True),
+    )
+
+    # The name created in a rolled back transaction is not cached
+    assert AlgoliaIndexName.get_id('MyPonyDjangoAlgolia') == 7
+    connection.rollback()
+    assert AlgoliaIndexName.ids == {}
+
+    AlgoliaIndexName.get_id('MyPonyDjangoAlgolia')
+    connection.commit()
+    connection.set_autocommit(True)
+    assert AlgoliaIndexName.ids == {'MyPonyDjangoAlgolia': 7}
+
+
+def test_get_object_ids(content_types, monkeypatch):
+    class FakeQuerySet(object):
+        def values_list(self, *fields):
+            requested.append(fields)
+            return [(42, 7), (43, 8)]
+
+    requested = []
+    for_pks_calls = []
+
+    def for_pks(index, model, pks):
+        for_pks_calls.append((index, model, pks))
+        return FakeQuerySet()
+
+    monkeypatch.setattr(AlgoliaIndex.objects, 'for_pks', for_pks)
+
+    # The objectIDs are read with one query, without building the instances
+    object_ids = AlgoliaIndex.objects.get_object_ids('MyPonyDjangoAlgolia', AlgoliaIndex, [42, 43])
+    assert object_ids == {42: 7, 43: 8}
+    assert for_pks_calls == [('MyPonyDjangoAlgolia', AlgoliaIndex, [42, 43])]
+    assert requested == [('object_id', 'id')]
+
+    # The primary keys which are not integers are stored as strings
+    AlgoliaIndex.objects.get_object_ids('MyPonyDjangoAlgolia', Session, ['rainbow'])
+    assert requested[-1] == ('object_key', 'id')
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+from decimal import Decimal
+
+import pytest
+
+from django.db import models
+
+from algolia import AlgoliaIndexer, AlgoliaQuery
+from algolia.query import EmptyQuery, compiled_filters
+
+
+class FacetedPony(models.Model):
+    ALGOLIA_INDEX_FIELDS = ('name', 'color', 'age', 'height')
+    ALGOLIA_FACETS = ('color', 'age', 'height')
+    ALGOLIA_TAGS_FIELD = 'tag_names'
+
+    name = models.CharField(max_length=255)
+    color = models.CharField(max_length=255)
+    age = models.IntegerField()
+    height = models.DecimalField(max_digits=5, decimal_places=2)
+
+    class Meta:
+        app_label = 'algolia'
+
+    def __unicode__(self):
+        return self.name
+
+
+class FakeIndexer(AlgoliaIndexer):
+
+    def __init__(self):
+        super(FakeIndexer, self).__init__({'API_KEY': 'key', 'API_SECRET': 'secret'})
+        self.searches = []
+        self.shards = []
+
+    def search(self, model, query, *args, **kwargs):
+        self.searches.append((model, query, args))
+        self.shards.append(kwargs.get('shard'))
+        return {'hits': []}
+
+
+@pytest.fixture()
+def indexer():
+    return FakeIndexer()
+
+
+@pytest.fixture()
+def query(indexer):
+    return indexer.query(FacetedPony)
+
+
+def test_filters_encoding(query):
+    query = query.filter(color='pink', age__gte=3, tag_names='magic')
+    assert query.get_params() == {
+        'facetFilters': [u'color:pink'],
+        'numericFilters': ['age>=3'],
+        'tagFilters': [u'magic'],
+    }
+
+
+def test_filters_merge(query):
+    query = query.filter(color='pink').filter(color__in=['pink', 'blue'], color__exact='pink')
+    query = query.filter(age__gte=3, age__lte=10).filter(age__gt=5).exclude(color='blue')
+    assert query.get_params() == {
+        'facetFilters': [u'color:pink'],
+        'numericFilters': ['age>5', 'age<=10'],
+    }
+
+
+def test_numeric_in_list(query):
+    query = query.filter(age__in=range(1, 500) + [1000], height__range=(1, Decimal('1.5')))
+    assert query.get_params()['numericFilters'] == [
+        ['age:1 to 499', 'age=1000'],
+        'height:1.0 to 1.5',
+    ]
+
+
+def test_decimal_in_list(query):
+    # The values between the decimals would match a range
+    query = query.filter(height__in=[1, Decimal('2.0'), 3.0])
+    assert query.get_params()['numericFilters'] == [
+        ['height=1.0', 'height=2.0', 'height=3.0'],
+    ]
+
+
+def test_tags_groups(query):
+    # A record has several tags, each filter requires its own tags
+    query = query.filter(tag_names='red').filter(tag_names__in=['old', 'new'])
+    assert not query.is_empty()
+    assert query.get_params() == {'tagFilters': [[u'new', u'old'], u'red']}
+
+    assert query.exclude(tag_names='old').get_params() == {
+        'tagFilters': [u'new', u'red', u'-old'],
+    }
+    assert query.exclude(tag_names='red').is_empty()
+
+
+def test_exclude(query):
+    query = query.exclude(color__in=['pink', 'blue'], age=3, tag_names='retired')
+    assert query.get_params() == {
+        'facetFilters': [u'color:-blue', u'color:-pink'],
+        'numericFilters': ['age!=3'],
+        'tagFilters': [u'-retired'],
+    }
+
+
+def test_undeclared_facets(query):
+    with pytest.raises(ValueError):
+        query.filter(name='Rainbow Dash')
+    with pytest.raises(ValueError):
+        query.filter(color__gte='pink')
+    with pytest.raises(ValueError):
+        query.exclude(age__gte=3)
+    with pytest.raises(ValueError):
+        query.filter(age='three')
+
+
+def test_memoized_filters(query):
+    compiled_filters.clear()
+    params = query.filter(age__in=[1, 2]).get_params()
+    params['numericFilters'].append('age=3')
+
+    assert len(compiled_filters) == 1
+    assert query.filter(age__in=[2, 1]).get_params() == {'numericFilters': ['age:1 to 2']}
+    assert len(compiled_filters) == 1
+
+
+def test_cache_key(query):
+    key = query.search('rainbow').filter(color='pink', age__lt=3).extra(page=2).get_cache_key()
+
+    assert key.startswith('algolia:FacetedPonyDjangoAlgolia:')
+    assert key == query.extra(page=2).filter(age__lt=3).search('rainbow').filter(
+        color__in=['pink'],
+    ).get_cache_key()
+    assert key != query.search('rainbow').filter(color='pink').extra(page=2).get_cache_key()
+
+
+def test_shard(indexer):
+    class ShardedPony(FacetedPony):
+        ALGOLIA_SHARD_FIELD = 'color'
+
+        class Meta:
+            proxy = True
+
+    query = indexer.query(ShardedPony).for_shard('pink').filter(age=3)
+    assert query.get_cache_key().startswith('algolia:ShardedPonyDjangoAlgolia__pink:')
+
+    query.execute()
+    assert indexer.shards == [u'pink']
+
+
+def test_execute(query, indexer):
+    query.search('rainbow').filter(color='pink').extra(hitsPerPage=50).execute()
+    assert indexer.searches == [
+        (FacetedPony, 'rainbow', ({'facetFilters': [u'color:pink'], 'hitsPerPage': 50},)),
+    ]
+
+
+def test_execute_empty(query, indexer):
+    response = query.filter(color='pink').exclude(color='pink').execute()
+    assert response['nbHits'] == 0
+    assert query.filter(age__gt=3, age__lt=2).is_empty()
+    assert indexer.searches == []
+
+
+def test_empty_query_params(query):
+    empty_query = query.filter(color='pink').exclude(color='pink')
+
+    with pytest.raises(EmptyQuery):
+        empty_query.get_params()
+    assert empty_query.get_cache_key() != query.get_cache_key()
+    assert empty_query.get_cache_key() == query.filter(age__gt=3, age__lt=2).get_cache_key()
+
+
+def test_get_record_facets(indexer):
+    pony = FacetedPony(name='Rainbow Dash', color='blue', age=3, height=Decimal('1.25'))
+    pony.tag_names = ['magic', 'fast', 'magic']
+
+    assert indexer.get_record(pony) == {
+        'name': u'Rainbow Dash',
+        'color': u'blue',
+        'age': 3,
+        'height': 1.25,
+        '_tags': [u'fast', u'magic'],
+        '__unicode__': u'Rainbow Dash',
+    }
+    assert indexer.get_index_settings(FacetedPony) == {'attributesForFaceting': ['color']}
+
+    # The partial updates have the same types
+    assert indexer.get_record(pony, ('age', 'height', 'tag_names')) == {
+        'age': 3,
+        'height': 1.25,
+        '_tags': [u'fast', u'magic'],
+    }
@@ -22,6 +22,8 @@ def indexer_on_valid_mode():
     indexer.is_valid = True
     indexer.save = assert_true
     indexer.delete = assert_true
+    indexer.bulk_save = assert_true
+    indexer.bulk_delete = assert_true
     return indexer
 
 
@@ -46,6 +48,7 @@ def realtime_processor():
 def managed_class():
     class MyClass():
         ALGOLIA_INDEX_FIELDS = ['some', 'fields']
+        pk = 1
     return MyClass
 
 
@@ -109,3 +112,110 @@ def test_realtime_handle_save(realtime_processor, managed_class, managed_instanc
 
 def test_realtime_handle_delete(realtime_processor, managed_class, managed_instance):
     realtime_processor.handle_delete(managed_class, managed_instance)
+
+
+def test_realtime_handle_save_should_index(realtime_processor):
+    class MyClass():
+        ALGOLIA_INDEX_FIELDS = ['some', 'fields']
+        ALGOLIA_SHOULD_INDEX = {'is_published': True}
+        is_published = True
+        pk = 1
+
+    calls = []
+    realtime_processor.indexer.bulk_save = lambda instances: calls.append('save')
+    realtime_processor.indexer.bulk_delete = lambda instances: calls.append('delete')
+    instance = MyClass()
+
+    realtime_processor.handle_save(MyClass, instance, True)
+    assert calls == ['save']
+
+    # An instance which should not be indexed anymore is deleted from the index
+    instance.is_published = False
+    realtime_processor.handle_save(MyClass, instance, False)
+    assert calls == ['save', 'delete']
+
+    # A new instance which should not be indexed is never sent
+    realtime_processor.handle_save(MyClass, instance, True)
+    assert calls == ['save', 'delete']
+
+
+def test_realtime_handle_save_dependents(realtime_processor):
+    class Author():
+        pk = 1
+
+    updated = []
+    realtime_processor.indexer.get_dependent_models = lambda model: [(object, 'author', ())]
+    realtime_processor.indexer.update_dependents = updated.append
+    author = Author()
+
+    realtime_processor.handle_save(Author, author, True)
+    assert updated == []
+
+    realtime_processor.handle_save(Author, author, False)
+    assert updated == [author]
+
+
+def test_realtime_process(realtime_processor, managed_class):
+    saved = []
+    deleted = []
+    realtime_processor.indexer.bulk_save = saved.extend
+    realtime_processor.indexer.bulk_delete = deleted.extend
+
+    first, second, third = managed_class(), managed_class(), managed_class()
+    second.pk = 2
+    third.pk = 3
+
+    realtime_processor.process([
+        ('save', first, True),
+        ('save', second, True),
+        ('save', first, False),
+        ('save', third, False),
+        ('delete', second, False),
+    ])
+
+    # Only the last operation on an instance is sent, in one batch by action
+    assert saved == [(first, True), (third, False)]
+    assert deleted == [second]
+
+
+def test_realtime_process_should_index_filter(realtime_processor):
+    queries = []
+
+    class FakeQuerySet(object):
+        def __init__(self, pks):
+            self.pks = pks
+
+        def filter(self, *args, **kwargs):
+            if 'pk__in' in kwargs:
+                queries.append(kwargs['pk__in'])
+                return FakeQuerySet(kwargs['pk__in'])
+            return self
+
+        def values_list(self, *args, **kwargs):
+            # Only the instance 2 passes the filter in database
+            return [pk for pk in self.pks if pk == 2]
+
+    class MyClass(object):
+        ALGOLIA_INDEX_FIELDS = ['some', 'fields']
+        ALGOLIA_SHOULD_INDEX = {'author__is_active': True}
+        objects = FakeQuerySet([])
+
+        def __init__(self, pk):
+            self.pk = pk
+
+    saved = []
+    deleted = []
+    realtime_processor.indexer.bulk_save = saved.extend
+    realtime_processor.indexer.bulk_delete = deleted.extend
+    first, second, third = MyClass(1), MyClass(2), MyClass(3)
+
+    realtime_processor.process([
+        ('save', first, True),
+        ('save', second, False),
+        ('save', third, False),
+    ])
+
+    # The filter of the buffered instances is evaluated with one query
+    assert queries == [[1, 2, 3]]
+    assert saved == [(second, False)]
+    assert deleted == [third]
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from django.db import transaction
+
+from algolia.transaction import on_commit
+
+
+class FakeFeatures(object):
+    autocommits_when_autocommit_is_off = False
+
+
+class FakeConnection(object):
+    """Mimics the transaction management of a connection inside an atomic block"""
+
+    features = FakeFeatures()
+
+    def __init__(self):
+        self.in_atomic_block = True
+        self.savepoint_ids = []
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def savepoint_rollback(self, sid):
+        pass
+
+    def set_autocommit(self, autocommit):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture()
+def connection(monkeypatch):
+    connection = FakeConnection()
+    monkeypatch.setattr(transaction, 'get_connection', lambda using=None: connection)
+    return connection
+
+
+@pytest.fixture()
+def batches():
+    return []
+
+
+def test_on_commit_outside_atomic_block(connection, batches):
+    connection.in_atomic_block = False
+    on_commit(batches.append, 'pony')
+    assert batches == [['pony']]
+
+
+def test_on_commit_after_commit(connection, batches):
+    on_commit(batches.append, 'rainbow')
+    on_commit(batches.append, 'dash')
+    assert batches == []
+
+    # The atomic block commits, then restores the autocommit mode
+    connection.in_atomic_block = False
+    connection.commit()
+    assert batches == []
+    connection.set_autocommit(True)
+    assert batches == [['rainbow', 'dash']]
+
+    # The hooks run only once
+    connection.set_autocommit(True)
+    assert batches == [['rainbow', 'dash']]
+
+
+def test_on_commit_rollback(connection, batches):
+    on_commit(batches.append, 'pony')
+
+    connection.in_atomic_block = False
+    connection.rollback()
+    connection.set_autocommit(True)
+    assert batches == []
+
+
+def test_on_commit_savepoint_rollback(connection, batches):
+    on_commit(batches.append, 'rainbow')
+
+    connection.savepoint_ids.append('s1')
+    on_commit(batches.append, 'dash')
+    connection.savepoint_ids.append('s2')
+    on_commit(batches.append, 'fluttershy')
+
+    # Rolling back to s1 drops the items registered in s1 and in its released s2
+    connection.savepoint_ids.pop()
+    connection.savepoint_rollback(connection.savepoint_ids.pop())
+
+    connection.in_atomic_block = False
+    connection.commit()
+    connection.set_autocommit(True)
+    assert batches == [['rainbow']]
+
+
+def test_on_commit_autocommits_when_autocommit_is_off(connection, batches, monkeypatch):
+    monkeypatch.setattr(connection.features, 'autocommits_when_autocommit_is_off', True)
+    connection.autocommit = False
+    on_commit(lambda items: batches.append((connection.autocommit, items)), 'pony')
+
+    # The atomic block commits, then sets the autocommit flag without set_autocommit,
+    # so the hooks run after the commit, with the flag already restored
+    connection.in_atomic_block = False
+    connection.commit()
+    assert batches == [(True, ['pony'])]
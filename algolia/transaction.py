@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from django.db import transaction
+
+__all__ = ['on_commit']
+
+
+def on_commit(callback, item, using=None):
+    """
+    Registers an item to pass to a callback after the commit of the current transaction.
+
+    Inside an atomic block, the items are buffered on the connection and each
+    callback is called once after the commit with the list of its items.
+    The items are dropped if the transaction, or the savepoint in which they
+    were registered, is rolled back. Outside of an atomic block, the callback
+    is called immediately.
+
+    Use:
+        with transaction.atomic():
+            pony.save()
+            on_commit(send_ponies, pony)
+        # send_ponies([pony]) has been called
+    """
+    connection = transaction.get_connection(using)
+
+    if not connection.in_atomic_block:
+        return callback([item])
+
+    install_commit_hooks(connection)
+    connection.algolia_commit_hooks.append((set(connection.savepoint_ids), callback, item))
+
+
+def run_commit_hooks(connection):
+    """Calls each callback with all its items registered during the committed transaction"""
+    hooks = connection.algolia_commit_hooks
+    connection.algolia_commit_hooks = []
+    batches = []
+
+    for sids, callback, item in hooks:
+        for batch_callback, items in batches:
+            if batch_callback == callback:
+                items.append(item)
+                break
+        else:
+            batches.append((callback, [item]))
+
+    for callback, items in batches:
+        callback(items)
+
+
+def install_commit_hooks(connection):
+    """
+    Wraps the transaction methods of a connection to run the commit hooks.
+
+    Connections are thread-local, so the hooks of a thread never see
+    the transactions of another one.
+    """
+    if hasattr(connection, 'algolia_commit_hooks'):
+        return
+
+    connection.algolia_commit_hooks = []
+    connection.algolia_run_commit_hooks_on_autocommit = False
+
+    commit = connection.commit
+    rollback = connection.rollback
+    savepoint_rollback = connection.savepoint_rollback
+    set_autocommit = connection.set_autocommit
+    close = connection.close
+
+    def commit_and_run_hooks():
+        commit()
+        # The hooks may write to the database, so they have to wait
+        # for the autocommit mode to be restored by the atomic block
+        if connection.features.autocommits_when_autocommit_is_off:
+            # The atomic block restores the flag without calling set_autocommit,
+            # the database is already back in autocommit mode after the commit
+            if not connection.in_atomic_block:
+                connection.autocommit = True
+            run_commit_hooks(connection)
+        else:
+            connection.algolia_run_commit_hooks_on_autocommit = True
+
+    def set_autocommit_and_run_hooks(autocommit):
+        set_autocommit(autocommit)
+        if autocommit and connection.algolia_run_commit_hooks_on_autocommit:
+            connection.algolia_run_commit_hooks_on_autocommit = False
+            run_commit_hooks(connection)
+
+    def rollback_and_drop_hooks():
+        rollback()
+        connection.algolia_commit_hooks = []
+
+    def savepoint_rollback_and_drop_hooks(sid):
+        savepoint_rollback(sid)
+        connection.algolia_commit_hooks = [
+            hook for hook in connection.algolia_commit_hooks if sid not in hook[0]
+        ]
+
+    def close_and_drop_hooks():
+        connection.algolia_commit_hooks = []
+        close()
+
+    connection.commit = commit_and_run_hooks
+    connection.set_autocommit = set_autocommit_and_run_hooks
+    connection.rollback = rollback_and_drop_hooks
+    connection.savepoint_rollback = savepoint_rollback_and_drop_hooks
+    connection.close = close_and_drop_hooks
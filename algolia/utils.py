@@ -1,10 +1,40 @@
 # -*- coding: utf-8 -*-
+import json
+import hashlib
 import warnings
 
 from django.conf import settings
 from django.utils import importlib
 
-__all__ = ['get_signal_processor_class', 'is_algolia_managed']
+__all__ = [
+    'get_signal_processor_class', 'is_algolia_managed', 'get_split_field',
+    'should_index', 'get_indexable_queryset', 'get_facets', 'get_shards',
+]
+
+# Attribute shared by all the records of a split instance
+DISTINCT_KEY = '__distinct__'
+
+# Attribute of the records which holds the tags, filtered with tagFilters
+TAGS_KEY = '_tags'
+
+# Separates the name of the index of a sharded model from the shard
+SHARD_SEPARATOR = '__'
+
+# Types of the facets, which select the encoding of their filters
+FACET_STRING = 'string'
+FACET_NUMERIC = 'numeric'
+FACET_TAGS = 'tags'
+
+NUMERIC_FIELDS = (
+    'AutoField',
+    'IntegerField',
+    'BigIntegerField',
+    'SmallIntegerField',
+    'PositiveIntegerField',
+    'PositiveSmallIntegerField',
+    'FloatField',
+    'DecimalField',
+)
 
 if not settings.configured:
     settings.configure(DEBUG=True, ALGOLIA={'QUIET': True})
@@ -125,3 +155,559 @@ def is_algolia_managed(instance):
         TypeError: is_algolia_managed() takes exactly 1 argument (0 given)
     """
     return hasattr(instance, 'ALGOLIA_INDEX_FIELDS')
+
+
+def get_should_index_filter(model):
+    """Return the Q object which selects the instances to index, or None if
+    the model has no ALGOLIA_SHOULD_INDEX filter
+
+    Tests:
+        >>> class PublishedClass(object): ALGOLIA_SHOULD_INDEX = {'published': True}
+        >>> get_should_index_filter(PublishedClass).children
+        [('published', True)]
+
+        >>> class MethodClass(object): ALGOLIA_SHOULD_INDEX = 'is_published'
+        >>> get_should_index_filter(MethodClass) is None
+        True
+
+        >>> get_should_index_filter(object) is None
+        True
+    """
+    from django.db.models import Q
+
+    condition = getattr(model, 'ALGOLIA_SHOULD_INDEX', None)
+
+    if isinstance(condition, dict):
+        return Q(**condition)
+    if isinstance(condition, Q):
+        return condition
+    return None
+
+
+def get_database_should_index_filter(model):
+    """Return the ALGOLIA_SHOULD_INDEX filter of a model which has to be evaluated by
+    the database (a Q object or lookups through relations), or None
+
+    Tests:
+        >>> class RelatedClass(object): ALGOLIA_SHOULD_INDEX = {'author__active': True}
+        >>> get_database_should_index_filter(RelatedClass).children
+        [('author__active', True)]
+
+        >>> class PublishedClass(object): ALGOLIA_SHOULD_INDEX = {'published': True}
+        >>> get_database_should_index_filter(PublishedClass) is None
+        True
+    """
+    condition = getattr(model, 'ALGOLIA_SHOULD_INDEX', None)
+
+    # Simple lookups are evaluated without hitting the database
+    if isinstance(condition, dict) and not any('__' in lookup for lookup in condition):
+        return None
+    return get_should_index_filter(model)
+
+
+def should_index(instance):
+    """Check if an instance has to be stored into the Algolia index, according
+    to the ALGOLIA_SHOULD_INDEX constant of its model: the name of a method of
+    the instance, or a queryset filter (dict of lookups or Q object)
+
+    Tests:
+        >>> class MethodClass(object):
+        ...     ALGOLIA_SHOULD_INDEX = 'is_published'
+        ...     published = False
+        ...     def is_published(self): return self.published
+        >>> method_instance = MethodClass()
+        >>> should_index(method_instance)
+        False
+        >>> method_instance.published = True
+        >>> should_index(method_instance)
+        True
+
+        >>> class FilterClass(object):
+        ...     ALGOLIA_SHOULD_INDEX = {'published': True, 'deleted': False}
+        ...     published = True
+        ...     deleted = True
+        >>> should_index(FilterClass())
+        False
+
+        >>> from django.contrib.auth.models import Permission
+        >>> permission = Permission(content_type_id=3)
+        >>> permission.ALGOLIA_SHOULD_INDEX = {'content_type': 3}
+        >>> should_index(permission)
+        True
+
+        >>> should_index(object())
+        True
+    """
+    # An instance which can not be routed to a shard is not indexed
+    if not is_routable(instance):
+        return False
+
+    condition = getattr(instance, 'ALGOLIA_SHOULD_INDEX', None)
+
+    if condition is None:
+        return True
+
+    if isinstance(condition, basestring):
+        return bool(getattr(instance, condition)())
+
+    database_filter = get_database_should_index_filter(instance.__class__)
+    if database_filter is not None:
+        queryset = instance.__class__.objects.filter(pk=instance.pk)
+        return queryset.filter(database_filter).exists()
+
+    return all(
+        get_lookup_value(instance, lookup) == getattr(value, 'pk', value)
+        for lookup, value in condition.items()
+    )
+
+
+def filter_should_index(instances):
+    """Return the instances which have to be stored into the Algolia index (see
+    `should_index`), with one query by model for the filters evaluated by the database
+
+    Tests:
+        >>> class FilterClass(object):
+        ...     ALGOLIA_SHOULD_INDEX = {'published': True}
+        ...     def __init__(self, published): self.published = published
+        >>> [instance.published for instance in filter_should_index(
+        ...     [FilterClass(True), FilterClass(False)])]
+        [True]
+    """
+    filters = {}
+    pks_by_model = {}
+
+    for instance in instances:
+        model = instance.__class__
+        if model not in filters:
+            filters[model] = get_database_should_index_filter(model)
+        if filters[model] is not None and is_routable(instance):
+            pks_by_model.setdefault(model, []).append(instance.pk)
+
+    indexable_keys = set()
+    for model, pks in pks_by_model.items():
+        queryset = model.objects.filter(pk__in=pks).filter(filters[model])
+        indexable_keys.update((model, unicode(pk)) for pk in queryset.values_list('pk', flat=True))
+
+    indexable_instances = []
+    for instance in instances:
+        if filters[instance.__class__] is None:
+            indexable = should_index(instance)
+        else:
+            indexable = (instance.__class__, unicode(instance.pk)) in indexable_keys
+        if indexable:
+            indexable_instances.append(instance)
+
+    return indexable_instances
+
+
+def get_lookup_value(instance, lookup):
+    """Return the value of an instance compared by a lookup without `__`, like
+    the database does: the primary key of the related instance for a foreign key
+
+    Tests:
+        >>> from django.contrib.auth.models import Permission
+        >>> get_lookup_value(Permission(content_type_id=3), 'content_type')
+        3
+        >>> get_lookup_value(Permission(pk=4), 'pk')
+        4
+    """
+    from django.db.models.fields import FieldDoesNotExist
+
+    if hasattr(instance, '_meta'):
+        try:
+            lookup = instance._meta.get_field(lookup).attname
+        except FieldDoesNotExist:
+            pass
+
+    return getattr(instance, lookup)
+
+
+def get_indexable_queryset(model):
+    """Return the queryset of the instances of a model which have to be indexed
+
+    The ALGOLIA_SHOULD_INDEX filter is applied by the database, so the
+    excluded instances are never fetched. When ALGOLIA_SHOULD_INDEX is a
+    method, the fetched instances have to go through `filter_indexable`.
+    """
+    queryset = model.objects.all()
+    should_index_filter = get_should_index_filter(model)
+
+    if should_index_filter is not None:
+        queryset = queryset.filter(should_index_filter)
+
+    return queryset
+
+
+def filter_indexable(model, instances):
+    """Iterates over the instances which pass the ALGOLIA_SHOULD_INDEX method of
+    their model, if any. A filter is already applied by `get_indexable_queryset`.
+
+    Tests:
+        >>> class MethodClass(object):
+        ...     ALGOLIA_SHOULD_INDEX = 'is_published'
+        ...     def __init__(self, published): self.published = published
+        ...     def is_published(self): return self.published
+        >>> instances = [MethodClass(True), MethodClass(False)]
+        >>> [instance.published for instance in filter_indexable(MethodClass, instances)]
+        [True]
+
+        >>> list(filter_indexable(object, [1, 2]))
+        [1, 2]
+    """
+    condition = getattr(model, 'ALGOLIA_SHOULD_INDEX', None)
+
+    if not isinstance(condition, basestring):
+        return iter(instances)
+
+    return (instance for instance in instances if getattr(instance, condition)())
+
+
+def get_dependencies(model):
+    """Return the ALGOLIA_DEPENDENCIES of a model: a dict which maps a lookup to a
+    related model, like 'author', to the attributes computed from this related model
+
+    Tests:
+        >>> class DependentClass(object): ALGOLIA_DEPENDENCIES = {'author': ('author_name',)}
+        >>> get_dependencies(DependentClass)
+        {'author': ('author_name',)}
+
+        >>> get_dependencies(object)
+        {}
+    """
+    return getattr(model, 'ALGOLIA_DEPENDENCIES', {})
+
+
+def get_related_model(model, lookup):
+    """Return the model at the end of a lookup through relations, like 'author__company'
+
+    Tests:
+        >>> from django.contrib.auth.models import User, Permission
+        >>> get_related_model(Permission, 'content_type')
+        <class 'django.contrib.contenttypes.models.ContentType'>
+        >>> get_related_model(User, 'groups__permissions__content_type')
+        <class 'django.contrib.contenttypes.models.ContentType'>
+    """
+    for name in lookup.split('__'):
+        model = model._meta.get_field(name).rel.to
+    return model
+
+
+def get_split_field(instance):
+    """Return the name of the field which has to be split into several records
+
+    Tests:
+        >>> class SplitClass(object): ALGOLIA_SPLIT_FIELD = 'body'
+        >>> get_split_field(SplitClass)
+        'body'
+        >>> get_split_field(SplitClass())
+        'body'
+
+        >>> get_split_field(object()) is None
+        True
+    """
+    return getattr(instance, 'ALGOLIA_SPLIT_FIELD', None)
+
+
+def get_shard_field(instance):
+    """Return the field, or lookup through relations, whose value routes the
+    instances of a model to one of several indexes
+
+    Tests:
+        >>> class ShardedClass(object): ALGOLIA_SHARD_FIELD = 'tenant_id'
+        >>> get_shard_field(ShardedClass())
+        'tenant_id'
+
+        >>> get_shard_field(object()) is None
+        True
+    """
+    return getattr(instance, 'ALGOLIA_SHARD_FIELD', None)
+
+
+def get_shard(instance):
+    """Return the shard of an instance as a string, or None if it has no shard.
+    A foreign key at the end of the lookup is read without fetching the related instance.
+
+    Tests:
+        >>> class Tenant(object): slug = 'acme'
+        >>> class ShardedClass(object):
+        ...     ALGOLIA_SHARD_FIELD = 'tenant__slug'
+        ...     tenant = Tenant()
+        >>> get_shard(ShardedClass())
+        u'acme'
+
+        >>> ShardedClass.tenant = None
+        >>> get_shard(ShardedClass()) is None
+        True
+
+        >>> from django.contrib.auth.models import Permission
+        >>> permission = Permission(content_type_id=3)
+        >>> permission.ALGOLIA_SHARD_FIELD = 'content_type'
+        >>> get_shard(permission)
+        u'3'
+    """
+    from django.db.models import Model
+
+    value = instance
+    names = get_shard_field(instance).split('__')
+
+    for name in names[:-1]:
+        value = getattr(value, name, None)
+        if value is None:
+            return None
+
+    try:
+        value = get_lookup_value(value, names[-1])
+    except AttributeError:
+        return None
+    if value is None:
+        return None
+
+    # A foreign key is filtered by the primary key of the related instance
+    if isinstance(value, Model):
+        value = value.pk
+
+    return unicode(value)
+
+
+def get_shard_related(model):
+    """Return the relations to select with the instances of a sharded model to read their
+    shard without other queries, or None
+
+    Tests:
+        >>> class ShardedClass(object): ALGOLIA_SHARD_FIELD = 'tenant__region__code'
+        >>> get_shard_related(ShardedClass)
+        'tenant__region'
+        >>> ShardedClass.ALGOLIA_SHARD_FIELD = 'tenant'
+        >>> get_shard_related(ShardedClass) is None
+        True
+        >>> get_shard_related(object) is None
+        True
+    """
+    related, _, name = (get_shard_field(model) or '').rpartition('__')
+    return related or None
+
+
+def get_shard_value(model, shard):
+    """Return the value of the shard field of a model which matches a shard string
+
+    Tests:
+        >>> from django.contrib.auth.models import User
+        >>> class ShardedUser(User):
+        ...     ALGOLIA_SHARD_FIELD = 'is_staff'
+        ...     class Meta: proxy = True
+        >>> get_shard_value(ShardedUser, u'False')
+        False
+        >>> ShardedUser.ALGOLIA_SHARD_FIELD = 'groups__id'
+        >>> get_shard_value(ShardedUser, u'3')
+        3
+    """
+    names = get_shard_field(model).split('__')
+    if len(names) > 1:
+        model = get_related_model(model, '__'.join(names[:-1]))
+
+    field = model._meta.get_field(names[-1])
+    if field.rel:
+        field = field.rel.get_related_field()
+
+    return field.to_python(shard)
+
+
+def is_routable(instance):
+    """Check if an instance can be routed to an index: a sharded instance needs a shard
+
+    Tests:
+        >>> class ShardedClass(object):
+        ...     ALGOLIA_SHARD_FIELD = 'locale'
+        ...     locale = None
+        >>> is_routable(ShardedClass())
+        False
+        >>> ShardedClass.locale = 'fr'
+        >>> is_routable(ShardedClass())
+        True
+
+        >>> is_routable(object())
+        True
+    """
+    return not get_shard_field(instance) or get_shard(instance) is not None
+
+
+def get_shards(model):
+    """Return the shards of the instances of a sharded model stored in database"""
+    shard_field = get_shard_field(model)
+    queryset = model.objects.exclude(**{'{0}__isnull'.format(shard_field): True})
+    shards = queryset.order_by(shard_field).values_list(shard_field, flat=True).distinct()
+
+    return [unicode(shard) for shard in shards]
+
+
+def get_tags_field(instance):
+    """Return the name of the attribute whose values are stored as the tags of the record
+
+    Tests:
+        >>> class TaggedClass(object): ALGOLIA_TAGS_FIELD = 'tag_names'
+        >>> get_tags_field(TaggedClass())
+        'tag_names'
+
+        >>> get_tags_field(object()) is None
+        True
+    """
+    return getattr(instance, 'ALGOLIA_TAGS_FIELD', None)
+
+
+def get_facets(model):
+    """Return a dict of the attributes of a model which can be filtered, by facet type:
+    the ALGOLIA_FACETS, numeric when they are numeric model fields, and the ALGOLIA_TAGS_FIELD.
+    The facets have to be indexed, else their filters would never match.
+
+    Tests:
+        >>> from django.contrib.auth.models import User
+        >>> class FacetedUser(User):
+        ...     ALGOLIA_INDEX_FIELDS = ('username', 'id', 'rank')
+        ...     ALGOLIA_FACETS = ('username', 'id', 'rank')
+        ...     ALGOLIA_TAGS_FIELD = 'group_names'
+        ...     class Meta: proxy = True
+        >>> sorted(get_facets(FacetedUser).items())
+        [('group_names', 'tags'), ('id', 'numeric'), ('rank', 'string'), ('username', 'string')]
+
+        >>> FacetedUser.ALGOLIA_FACETS = ('username', 'email')
+        >>> get_facets(FacetedUser)
+        Traceback (most recent call last):
+        ImproperlyConfigured: FacetedUser.email is a facet, add it to ALGOLIA_INDEX_FIELDS
+
+        >>> get_facets(object)
+        {}
+    """
+    from django.core.exceptions import ImproperlyConfigured
+    from django.db.models.fields import FieldDoesNotExist
+
+    facets = {}
+    index_fields = get_instance_fields(model)
+
+    for name in getattr(model, 'ALGOLIA_FACETS', ()):
+        if name not in index_fields:
+            raise ImproperlyConfigured(
+                '{0}.{1} is a facet, add it to ALGOLIA_INDEX_FIELDS'.format(model.__name__, name)
+            )
+
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Properties and methods are stored as strings
+            facets[name] = FACET_STRING
+            continue
+
+        if field.get_internal_type() in NUMERIC_FIELDS:
+            facets[name] = FACET_NUMERIC
+        else:
+            facets[name] = FACET_STRING
+
+    tags_field = get_tags_field(model)
+    if tags_field:
+        facets[tags_field] = FACET_TAGS
+
+    return facets
+
+
+def split_text(text, size):
+    """Split a text into chunks of at most `size` characters, cutting on whitespaces
+    when it is possible. Always returns at least one chunk.
+
+    Tests:
+        >>> split_text(u'', 10)
+        [u'']
+        >>> split_text(u'Rainbow Dash', 20)
+        [u'Rainbow Dash']
+        >>> split_text(u'Rainbow Dash and Fluttershy', 12)
+        [u'Rainbow Dash', u'and', u'Fluttershy']
+        >>> split_text(u'Pinkiepie', 4)
+        [u'Pink', u'iepi', u'e']
+    """
+    chunks = []
+    text = text.strip()
+
+    while len(text) > size:
+        cut = text.rfind(u' ', 0, size + 1)
+        if cut <= 0:
+            cut = size
+        chunks.append(text[:cut].strip())
+        text = text[cut:].strip()
+
+    chunks.append(text)
+    return chunks
+
+
+def get_chunk_object_id(object_id, position):
+    """Return the Algolia objectID of the chunk at `position` of a split instance
+
+    Tests:
+        >>> get_chunk_object_id(42, 0)
+        '42-0'
+        >>> get_chunk_object_id(42, 3)
+        '42-3'
+    """
+    return '{0}-{1}'.format(object_id, position)
+
+
+def get_record_fingerprint(record):
+    """Return a short fingerprint of an Algolia record, used to detect its changes
+
+    Tests:
+        >>> get_record_fingerprint({'a': u'b', 'c': 1})
+        '55219234'
+        >>> get_record_fingerprint({'c': 1, 'a': u'b'})
+        '55219234'
+    """
+    content = json.dumps(record, sort_keys=True, default=unicode)
+    return hashlib.md5(content.encode('utf-8')).hexdigest()[:8]
+
+
+def deduplicate_hits(hits, key=DISTINCT_KEY):
+    """Keep only the first hit (the best ranked) for each value of `key`
+
+    Tests:
+        >>> hits = [{'objectID': '1-0', '__distinct__': 1},
+        ...         {'objectID': '2-0', '__distinct__': 2},
+        ...         {'objectID': '1-1', '__distinct__': 1}]
+        >>> [hit['objectID'] for hit in deduplicate_hits(hits)]
+        ['1-0', '2-0']
+
+        >>> deduplicate_hits([{'objectID': 1}, {'objectID': 2}])
+        [{'objectID': 1}, {'objectID': 2}]
+    """
+    seen = set()
+    unique_hits = []
+
+    for hit in hits:
+        value = hit.get(key, hit.get('objectID'))
+        if value in seen:
+            continue
+        seen.add(value)
+        unique_hits.append(hit)
+
+    return unique_hits
+
+
+def iterate_chunks(queryset, chunk_size=1000):
+    """Iterates over a queryset by lists of at most `chunk_size` instances sorted by primary key
+
+    The chunks are fetched with a filter on the last primary key, so the memory
+    stays bounded by the chunk size and no offset is computed by the database.
+
+    Use:
+        for instances in iterate_chunks(MyPony.objects.all(), 500):
+            do_something(instances)
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = None
+
+    while True:
+        chunk_queryset = queryset
+        if last_pk is not None:
+            chunk_queryset = chunk_queryset.filter(pk__gt=last_pk)
+
+        instances = list(chunk_queryset[:chunk_size])
+        if not instances:
+            return
+
+        yield instances
+        last_pk = instances[-1].pk